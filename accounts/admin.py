@@ -17,10 +17,30 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(Doctor)
 class DoctorAdmin(admin.ModelAdmin):
-    list_display = ('user', 'specialization', 'license_number', 'experience_years', 'consultation_fee', 'is_available')
+    list_display = ('user', 'specialization', 'license_number', 'experience_years', 'consultation_fee', 'weekly_slots', 'is_available')
     list_filter = ('specialization', 'is_available')
     search_fields = ('user__first_name', 'user__last_name', 'license_number')
     list_editable = ('is_available',)
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user').prefetch_related('availability')
+    
+    @admin.display(description='Weekly slots')
+    def weekly_slots(self, obj):
+        from appointments import availability
+        week = availability.week_matrix(
+            (window.weekday, window.start_time, window.end_time)
+            for window in obj.availability.all() if window.is_available
+        )
+        return availability.free_count(week)
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index where available instead of LIKE '%..%' joins
+        from appointments import search
+        if not search_term or not search.is_supported():
+            return super().get_search_results(request, queryset, search_term)
+        matches = queryset.filter(pk__in=search.search_ids(search_term, limit=1000))
+        return matches | queryset.filter(license_number__iexact=search_term), False
 
 
 @admin.register(Patient)
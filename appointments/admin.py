@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import TimeSlot, DoctorAvailability, Appointment, AppointmentHistory
+from . import availability
+from .models import TimeSlot, DoctorAvailability, Appointment, AppointmentHistory, SlotHold, DoctorStats, PatientStats
 
 
 @admin.register(TimeSlot)
@@ -10,9 +11,13 @@ class TimeSlotAdmin(admin.ModelAdmin):
 
 @admin.register(DoctorAvailability)
 class DoctorAvailabilityAdmin(admin.ModelAdmin):
-    list_display = ('doctor', 'get_weekday_display', 'start_time', 'end_time', 'is_available')
+    list_display = ('doctor', 'get_weekday_display', 'start_time', 'end_time', 'slot_count', 'is_available')
     list_filter = ('weekday', 'is_available')
     search_fields = ('doctor__user__first_name', 'doctor__user__last_name')
+    
+    @admin.display(description='Slots')
+    def slot_count(self, obj):
+        return availability.window_mask(obj.start_time, obj.end_time).bit_count()
 
 
 @admin.register(Appointment)
@@ -29,3 +34,33 @@ class AppointmentHistoryAdmin(admin.ModelAdmin):
     list_display = ('appointment', 'old_status', 'new_status', 'changed_by', 'changed_at')
     list_filter = ('old_status', 'new_status', 'changed_at')
     readonly_fields = ('changed_at',)
+
+
+@admin.register(SlotHold)
+class SlotHoldAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'patient', 'appointment_date', 'appointment_time', 'expires_at')
+    list_filter = ('appointment_date',)
+    readonly_fields = ('created_at',)
+
+
+class ReadOnlyStatsAdmin(admin.ModelAdmin):
+    """The counters are derived from appointments; repair them with rebuild_stats."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DoctorStats)
+class DoctorStatsAdmin(ReadOnlyStatsAdmin):
+    list_display = ('doctor', 'total_patients', 'pending_count', 'confirmed_count', 'completed_count', 'cancelled_count', 'updated_at')
+
+
+@admin.register(PatientStats)
+class PatientStatsAdmin(ReadOnlyStatsAdmin):
+    list_display = ('patient', 'pending_count', 'confirmed_count', 'completed_count', 'cancelled_count', 'updated_at')
@@ -0,0 +1,173 @@
+"""
+Async variants of the read-heavy views, served when ``ASYNC_VIEWS`` is on
+(``medibook/asgi.py`` turns it on for ASGI deployments).
+
+A sync view ties up a worker thread for the whole request, including the
+time spent waiting on the database. These run on the event loop instead:
+the dashboards use the async ORM and issue their independent queries
+together with ``asyncio.gather``. The cache-backed helpers shared with the
+sync views (the directory, the availability lookups, the stats counters)
+are called through ``sync_to_async``.
+
+In Django 4.2 the async ORM still runs each query in a thread, so the
+gain is in how many slow clients a worker can hold, not in the speed of
+one request. Templates render synchronously, so everything a template
+reads is loaded before ``render``: querysets as lists, and the user, the
+flash messages and the slot registry through ``_load_page``. The
+dashboards' ``{% cache %}`` fragments still hit the cache while rendering,
+so those two templates are rendered through ``sync_to_async`` to keep a
+network cache off the event loop.
+"""
+import asyncio
+from datetime import date
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.contrib.messages import get_messages
+from django.db.models import Count, Q
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect, render
+
+from accounts.models import Doctor, Patient
+from medibook.routers import use_replica
+from . import availability, fragments, stats, timeslots, views
+from .models import Appointment, DoctorStats, PatientStats
+
+
+@sync_to_async
+def _load_user(request):
+    """Resolve ``request.user``, which reads the session on first use."""
+    return request.user.is_authenticated
+
+
+@sync_to_async
+def _load_page(request):
+    """Load what a rendered page reads lazily; return whether the user is logged in."""
+    timeslots.get_registry()
+    len(get_messages(request))
+    return request.user.is_authenticated
+
+
+def alogin_required(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await _load_page(request):
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+@alogin_required
+@use_replica
+async def patient_dashboard(request):
+    if request.user.user_type != 'patient':
+        return redirect('appointments:doctor_dashboard')
+
+    try:
+        patient = await Patient.objects.aget(user_id=request.user.pk)
+    except Patient.DoesNotExist:
+        raise Http404('Patient not found')
+    today = date.today()
+
+    appointments = Appointment.objects.filter(patient=patient)
+    rows = appointments.select_related('doctor__user')
+    counts, patient_stats, fragment_key, upcoming_appointments, past_appointments = await asyncio.gather(
+        appointments.aaggregate(
+            upcoming_count=Count('id', filter=Q(appointment_date__gte=today, status__in=['pending', 'confirmed'])),
+            past_count=Count('id', filter=Q(appointment_date__lt=today)),
+        ),
+        sync_to_async(stats.get_stats)(PatientStats, patient.pk),
+        sync_to_async(fragments.key)('patient', patient.pk),
+        _list(rows.filter(
+            appointment_date__gte=today,
+            status__in=['pending', 'confirmed']
+        ).order_by('appointment_date', 'appointment_time')),
+        _list(rows.filter(
+            appointment_date__lt=today
+        ).order_by('-appointment_date', '-appointment_time')[:5]),
+    )
+
+    context = {
+        'upcoming_appointments': upcoming_appointments,
+        'past_appointments': past_appointments,
+        'total_appointments': patient_stats.total_appointments,
+        'fragment_key': fragment_key,
+        'fragment_timeout': settings.FRAGMENT_CACHE_SECONDS,
+        **counts,
+    }
+    return await sync_to_async(render)(request, 'appointments/patient_dashboard.html', context)
+
+
+@alogin_required
+@use_replica
+async def doctor_dashboard(request):
+    if request.user.user_type != 'doctor':
+        return redirect('appointments:patient_dashboard')
+
+    try:
+        doctor = await Doctor.objects.aget(user_id=request.user.pk)
+    except Doctor.DoesNotExist:
+        raise Http404('Doctor not found')
+    today = date.today()
+
+    active = Appointment.objects.filter(doctor=doctor, status__in=['pending', 'confirmed'])
+    rows = active.select_related('patient__user')
+    counts, doctor_stats, fragment_key, today_appointments, upcoming_appointments = await asyncio.gather(
+        active.filter(appointment_date__gte=today).aaggregate(
+            today_count=Count('id', filter=Q(appointment_date=today)),
+            upcoming_count=Count('id', filter=Q(appointment_date__gt=today)),
+        ),
+        sync_to_async(stats.get_stats)(DoctorStats, doctor.pk),
+        sync_to_async(fragments.key)('doctor', doctor.pk),
+        _list(rows.filter(appointment_date=today).order_by('appointment_time')),
+        _list(rows.filter(appointment_date__gt=today).order_by('appointment_date', 'appointment_time')[:10]),
+    )
+
+    context = {
+        'doctor': doctor,
+        'today_appointments': today_appointments,
+        'upcoming_appointments': upcoming_appointments,
+        'total_patients': doctor_stats.total_patients,
+        'fragment_key': fragment_key,
+        'fragment_timeout': settings.FRAGMENT_CACHE_SECONDS,
+        **counts,
+    }
+    return await sync_to_async(render)(request, 'appointments/doctor_dashboard.html', context)
+
+
+@use_replica
+async def doctor_list(request):
+    context, _ = await asyncio.gather(
+        sync_to_async(views._doctor_list_context)(request),
+        _load_page(request),
+    )
+    return render(request, 'appointments/doctor_list.html', context)
+
+
+async def doctor_slots(request, doctor_id):
+    day = views._slots_day(request)
+    if isinstance(day, JsonResponse):
+        return day
+    entry, _ = await asyncio.gather(
+        sync_to_async(availability.get_day)(doctor_id, day),
+        _load_user(request),
+    )
+    return views._slots_response(doctor_id, day, entry, request.user.id)
+
+
+async def doctor_slots_range(request, doctor_id):
+    dates = views._slots_range(request)
+    if isinstance(dates, JsonResponse):
+        return dates
+    start, end = dates
+    entries, _ = await asyncio.gather(
+        sync_to_async(availability.get_range)(doctor_id, start, end),
+        _load_user(request),
+    )
+    return views._slots_range_response(doctor_id, start, end, entries, request.user.id)
@@ -0,0 +1,316 @@
+"""
+Per-doctor, per-day slot availability bitmaps.
+
+A day is summarised as a 16-bit mask over ``TimeSlot.TIME_CHOICES``: bit ``i``
+stands for the ``i``-th slot. Each cached entry keeps the mask of slots inside
+the doctor's availability window, the mask of slots already booked and the
+unexpired slot holds, so the free slots can be served without touching the
+database once the entry is warm.
+
+Entries are tagged with a per-doctor version, read before the entry is
+built. Any committed change to a doctor's appointments, holds or schedule
+bumps the version (see ``signals``), which retires every cached day of that
+doctor at once, including entries built from reads that raced the commit.
+A missing version is recreated from the current time, so an evicted
+counter never revives entries cached under an earlier value.
+
+A doctor's week is a 7 x ``SLOT_COUNT`` matrix stored as a tuple of seven day
+masks (Monday first), and a date window is a list of day masks. Intersections,
+free counts and next-free lookups work on whole days at once with bitwise
+operations (AND, popcount, lowest set bit) rather than looping over slots.
+"""
+import time
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from accounts.models import Doctor
+from . import timeslots
+from .models import Appointment, DoctorAvailability, SlotHold, TimeSlot
+
+
+SLOT_TIMES = tuple(value for value, label in TimeSlot.TIME_CHOICES)
+SLOT_LABELS = tuple(label for value, label in TimeSlot.TIME_CHOICES)
+SLOT_INDEX = {value: index for index, value in enumerate(SLOT_TIMES)}
+SLOT_COUNT = len(SLOT_TIMES)
+FULL_MASK = (1 << SLOT_COUNT) - 1
+
+# Appointments in these states occupy their slot
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+CACHE_TIMEOUT = 60 * 60  # 1 hour
+
+# Longest window the range lookup accepts
+MAX_RANGE_DAYS = 60
+
+
+def window_mask(start_time, end_time):
+    """Return the mask of slots starting within ``[start_time, end_time)``."""
+    # SLOT_TIMES is sorted, so the window is one contiguous run of bits
+    first = bisect_left(SLOT_TIMES, start_time.strftime('%H:%M'))
+    last = bisect_left(SLOT_TIMES, end_time.strftime('%H:%M'))
+    return (1 << last) - (1 << first) if last > first else 0
+
+
+def mask_to_indexes(mask):
+    """Return the slot indexes whose bit is set in ``mask``."""
+    return [index for index in range(SLOT_COUNT) if mask >> index & 1]
+
+
+def week_matrix(windows):
+    """
+    Return the 7-tuple of open masks described by ``(weekday, start_time,
+    end_time)`` availability windows.
+    """
+    week = [0] * 7
+    for weekday, start_time, end_time in windows:
+        week[weekday] |= window_mask(start_time, end_time)
+    return tuple(week)
+
+
+def week_matrices(doctor_ids):
+    """
+    Return ``{doctor_id: week_matrix}`` for the available windows of the
+    given doctors (a list or a queryset of ids), in one query. Doctors
+    without any window are left out.
+    """
+    windows = {}
+    rows = DoctorAvailability.objects.filter(
+        doctor__in=doctor_ids,
+        is_available=True
+    ).values_list('doctor_id', 'weekday', 'start_time', 'end_time')
+    for doctor_id, weekday, start_time, end_time in rows:
+        windows.setdefault(doctor_id, []).append((weekday, start_time, end_time))
+    return {doctor_id: week_matrix(rows) for doctor_id, rows in windows.items()}
+
+
+def project_week(week, days):
+    """Return the open mask of each date in ``days`` under a week matrix."""
+    return [week[day.weekday()] for day in days]
+
+
+def intersect(*rows):
+    """AND equally long runs of day masks together, day by day."""
+    return list(map(_and_all, *rows))
+
+
+def _and_all(*masks):
+    result = FULL_MASK
+    for mask in masks:
+        result &= mask
+    return result
+
+
+def free_count(masks):
+    """Return the number of set slots across a run of day masks."""
+    return sum(mask.bit_count() for mask in masks)
+
+
+def next_free(masks, after=None):
+    """
+    Return the ``(day_offset, slot_index)`` of the first set slot in a run of
+    day masks, optionally strictly after the ``(day_offset, slot_index)``
+    position ``after``. Returns ``None`` if there is none.
+    """
+    first_offset = 0
+    if after is not None:
+        first_offset, index = after
+        if first_offset < len(masks):
+            mask = masks[first_offset] & ~((2 << index) - 1)
+            if mask:
+                return first_offset, (mask & -mask).bit_length() - 1
+        first_offset += 1
+    for offset in range(first_offset, len(masks)):
+        mask = masks[offset]
+        if mask:
+            return offset, (mask & -mask).bit_length() - 1
+    return None
+
+
+def _version_key(doctor_id):
+    return f'appointments:slots:version:{doctor_id}'
+
+
+def _day_key(doctor_id, day):
+    return f'appointments:slots:{doctor_id}:{day.isoformat()}'
+
+
+def date_range(start, end):
+    """Return every date in ``[start, end]``."""
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def _slot_ids():
+    """Map each slot index to its ``TimeSlot`` primary key (``None`` if missing)."""
+    slot_ids = [None] * SLOT_COUNT
+    for slot in timeslots.all_slots():
+        index = SLOT_INDEX.get(slot.time)
+        if index is not None:
+            slot_ids[index] = slot.id
+    return tuple(slot_ids)
+
+
+def _booked_mask_expression():
+    """SQL expression summing each booked slot's bit, one row per date."""
+    return Sum(
+        Case(
+            *[When(appointment_time__time=value, then=Value(1 << index)) for index, value in enumerate(SLOT_TIMES)],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    )
+
+
+def build_range(doctor_id, start, end):
+    """
+    Compute the ``(open_mask, booked_mask, slot_ids, holds)`` entry of every
+    date in ``[start, end]``, returned as a list in date order.
+
+    The booked masks of the whole window come from one query grouped by date
+    over the ``(doctor, appointment_date, appointment_time)`` unique index, so
+    the cost depends on the window rather than on the size of the table.
+    ``slot_ids`` maps each slot index to its ``TimeSlot`` primary key and
+    ``holds`` maps a slot index to the holding patient's user id and the
+    hold's expiry timestamp. Returns ``None`` if the doctor does not exist.
+    """
+    is_available = Doctor.objects.filter(pk=doctor_id).values_list('is_available', flat=True).first()
+    if is_available is None:
+        return None
+
+    week = (0,) * 7
+    if is_available:
+        week = week_matrices([doctor_id]).get(doctor_id, week)
+
+    # The unique constraint allows one appointment per slot, so the sum of
+    # the bits is the booked mask
+    booked = dict(
+        Appointment.objects.filter(
+            doctor_id=doctor_id,
+            appointment_date__range=(start, end),
+            status__in=ACTIVE_STATUSES
+        ).order_by().values('appointment_date').annotate(
+            mask=_booked_mask_expression()
+        ).values_list('appointment_date', 'mask')
+    )
+
+    holds = {}
+    active_holds = SlotHold.objects.filter(
+        doctor_id=doctor_id,
+        appointment_date__range=(start, end),
+        expires_at__gt=timezone.now()
+    ).values_list('appointment_date', 'appointment_time__time', 'patient__user_id', 'expires_at')
+    for day, value, user_id, expires_at in active_holds:
+        if value in SLOT_INDEX:
+            holds.setdefault(day, {})[SLOT_INDEX[value]] = (user_id, expires_at.timestamp())
+
+    slot_ids = _slot_ids()
+    present_mask = sum(1 << index for index, slot_id in enumerate(slot_ids) if slot_id is not None)
+
+    days = date_range(start, end)
+    return [
+        (open_mask & present_mask, booked.get(day, 0), slot_ids, holds.get(day, {}))
+        for day, open_mask in zip(days, project_week(week, days))
+    ]
+
+
+def _fresh_version():
+    return time.time_ns()
+
+
+def get_range(doctor_id, start, end):
+    """
+    Return the cached entries of every date in ``[start, end]``, rebuilding
+    the window on any miss. Returns ``None`` if the doctor does not exist.
+    """
+    days = date_range(start, end)
+    version_key = _version_key(doctor_id)
+    day_keys = [_day_key(doctor_id, day) for day in days]
+    cached = cache.get_many([version_key] + day_keys)
+    version = cached.get(version_key)
+    if version is None:
+        version = cache.get_or_set(version_key, _fresh_version, None)
+    entries = [cached.get(key) for key in day_keys]
+    if all(entry is not None and entry[0] == version for entry in entries):
+        return [entry[1:] for entry in entries]
+
+    built = build_range(doctor_id, start, end)
+    if built is not None:
+        cache.set_many(
+            {key: (version,) + entry for key, entry in zip(day_keys, built)},
+            CACHE_TIMEOUT
+        )
+    return built
+
+
+def get_day(doctor_id, day):
+    """
+    Return the cached ``(open_mask, booked_mask, slot_ids, holds)`` entry for
+    a day, building it on a miss. Returns ``None`` if the doctor does not exist.
+    """
+    entries = get_range(doctor_id, day, day)
+    return entries[0] if entries is not None else None
+
+
+def past_mask(day):
+    """Return the mask of the slots of ``day`` that have already started."""
+    now = timezone.localtime()
+    if day > now.date():
+        return 0
+    if day < now.date():
+        return FULL_MASK
+    # SLOT_TIMES is sorted, so the started slots are the lowest bits
+    return (1 << bisect_right(SLOT_TIMES, now.strftime('%H:%M'))) - 1
+
+
+def free_mask(entry, user_id=None, day=None):
+    """
+    Return the mask of open slots of a day entry that are neither booked nor
+    held by someone other than the user ``user_id``. Given the entry's
+    ``day``, slots that have already started are left out too.
+    """
+    open_mask, booked_mask, slot_ids, holds = entry
+    mask = open_mask & ~booked_mask
+    if day is not None:
+        mask &= ~past_mask(day)
+    if holds:
+        now = time.time()
+        for index, (holder_id, expires_at) in holds.items():
+            if holder_id != user_id and expires_at > now:
+                mask &= ~(1 << index)
+    return mask
+
+
+def free_matrix(entries, user_id=None, days=None):
+    """
+    Return a dense days x slots matrix of 1 (free) / 0 (taken) cells; pass
+    the entries' ``days`` to leave out started slots.
+    """
+    matrix = []
+    for entry, day in zip(entries, days or [None] * len(entries)):
+        mask = free_mask(entry, user_id, day)
+        matrix.append([mask >> index & 1 for index in range(SLOT_COUNT)])
+    return matrix
+
+
+def free_slots(entry, user_id=None, day=None):
+    """Return the free slots of a day entry as JSON-ready dicts."""
+    slot_ids = entry[2]
+    return [
+        {'id': slot_ids[index], 'time': SLOT_TIMES[index], 'label': SLOT_LABELS[index]}
+        for index in mask_to_indexes(free_mask(entry, user_id, day))
+    ]
+
+
+def invalidate_doctor(doctor_id):
+    """
+    Drop every cached day of a doctor. Call it once the change is committed,
+    so that no entry built from the old rows is tagged with the new version.
+    """
+    version_key = _version_key(doctor_id)
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, _fresh_version(), None)
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The availability, directory and fragment caches are invalidated through
+    versions kept in the default cache, which every worker must see.
+    """
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            'The default cache is local to each process, so a booking handled '
+            'by one worker does not invalidate the cached slots, directory '
+            'pages or dashboards of the others.',
+            hint='Set REDIS_URL (or configure a shared CACHES backend) when running more than one process.',
+            id='appointments.W001',
+        )
+    ]
@@ -0,0 +1,139 @@
+"""
+Cached doctor directory behind the doctor list page.
+
+Doctors are listed in pages with keyset (cursor) pagination on the primary
+key: a page is "the next ``page_size`` available doctors after id N", which
+costs the same index walk on page 100 as on page 1. Pages and the
+per-specialization counts (facets) are cached, so repeat visits are served
+without touching the database. Doctor and doctor-user changes bump a version
+(on commit) that retires every cached entry at once. A missing version is
+recreated from the current time, so an evicted counter never revives pages
+cached under an earlier value.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from accounts.models import Doctor
+
+
+CACHE_TIMEOUT = 60 * 15  # 15 minutes
+
+ALL = 'all'
+VERSION_KEY = 'appointments:directory:version'
+FACETS_KEY = 'appointments:directory:facets'
+
+
+class Page:
+    """One page of doctors plus the cursors of its neighbours."""
+
+    def __init__(self, doctors, previous_cursor, next_cursor):
+        self.doctors = doctors
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+
+def page_size_from(value):
+    """Parse a requested page size, falling back to the configured default."""
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return settings.DOCTOR_LIST_PAGE_SIZE
+    return max(1, min(page_size, settings.DOCTOR_LIST_MAX_PAGE_SIZE))
+
+
+def _available_doctors(specialization):
+    doctors = Doctor.objects.filter(is_available=True).select_related('user')
+    if specialization:
+        doctors = doctors.filter(specialization=specialization)
+    return doctors
+
+
+def build_page(specialization, after=None, before=None, page_size=None):
+    """
+    Load one page of available doctors ordered by id: the first page, the
+    page after id ``after`` or the page before id ``before``.
+    """
+    page_size = page_size or settings.DOCTOR_LIST_PAGE_SIZE
+    doctors = _available_doctors(specialization)
+
+    if before is not None:
+        # Walk backwards and flip, fetching one extra row to see if there is more
+        rows = list(doctors.filter(id__lt=before).order_by('-id')[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = doctors.filter(id__gte=before).exists()
+    else:
+        if after is not None:
+            doctors_after = doctors.filter(id__gt=after)
+        else:
+            doctors_after = doctors
+        rows = list(doctors_after.order_by('id')[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after is not None and doctors.filter(id__lte=after).exists()
+
+    return Page(
+        rows,
+        rows[0].id if rows and has_previous else None,
+        rows[-1].id if rows and has_next else None
+    )
+
+
+def build_facets():
+    """Return ``(value, label, count)`` for every specialization, in one query."""
+    counts = dict(
+        Doctor.objects.filter(is_available=True).order_by().values('specialization').annotate(
+            count=Count('id')
+        ).values_list('specialization', 'count')
+    )
+    return [(value, label, counts.get(value, 0)) for value, label in Doctor.SPECIALIZATION_CHOICES]
+
+
+def _fresh_version():
+    return time.time_ns()
+
+
+def _page_key(specialization, after, before, page_size):
+    return f'appointments:directory:{specialization or ALL}:{after}:{before}:{page_size}'
+
+
+def get_directory(specialization=None, after=None, before=None, page_size=None):
+    """
+    Return ``(page, facets)`` for one specialization, or for every available
+    doctor when ``specialization`` is empty.
+    """
+    page_size = page_size or settings.DOCTOR_LIST_PAGE_SIZE
+    valid = dict(Doctor.SPECIALIZATION_CHOICES)
+    if specialization and specialization not in valid:
+        # Unknown filters match nobody; don't let them create cache entries
+        return Page([], None, None), get_directory(page_size=page_size)[1]
+
+    page_key = _page_key(specialization, after, before, page_size)
+    cached = cache.get_many([VERSION_KEY, page_key, FACETS_KEY])
+    version = cached.get(VERSION_KEY)
+    if version is None:
+        version = cache.get_or_set(VERSION_KEY, _fresh_version, None)
+    page = cached.get(page_key)
+    facets = cached.get(FACETS_KEY)
+
+    entries = {}
+    if page is None or page[0] != version:
+        page = (version, build_page(specialization, after, before, page_size))
+        entries[page_key] = page
+    if facets is None or facets[0] != version:
+        facets = (version, build_facets())
+        entries[FACETS_KEY] = facets
+    if entries:
+        cache.set_many(entries, CACHE_TIMEOUT)
+    return page[1], facets[1]
+
+
+def invalidate():
+    """Retire every cached page, e.g. after a doctor's profile changed."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _fresh_version(), None)
@@ -0,0 +1,106 @@
+"""
+"Soonest available" doctor finder.
+
+Ranks the doctors of a specialization by their earliest free slot in a date
+window. The availability windows, booked slots and holds of every candidate
+are loaded with one grouped query each and turned into per-doctor masks, so
+the cost does not grow with one query per doctor. Each doctor then becomes a
+lazy, time-ordered stream of free slots and ``heapq.merge`` interleaves the
+streams; the first slot seen for a doctor is that doctor's earliest one.
+"""
+import heapq
+
+from django.utils import timezone
+
+from accounts.models import Doctor
+from .availability import (
+    ACTIVE_STATUSES, _booked_mask_expression, _slot_ids, date_range, past_mask, week_matrices
+)
+from .models import Appointment, SlotHold
+
+
+def _free_slot_stream(doctor_id, weekday_masks, taken, days, first_day_mask):
+    """Yield ``(date, slot_index, doctor_id)`` for every free slot, in time order."""
+    for position, day in enumerate(days):
+        mask = weekday_masks[day.weekday()] & ~taken.get((doctor_id, day), 0)
+        if position == 0:
+            mask &= ~first_day_mask
+        while mask:
+            lowest = mask & -mask
+            yield day, lowest.bit_length() - 1, doctor_id
+            mask ^= lowest
+
+
+def soonest_available(specialization, start, end, limit, user_id=None):
+    """
+    Return up to ``limit`` ``(doctor, date, slot_index, slot_id)`` tuples, one
+    per available doctor, ordered by the doctor's earliest free slot in
+    ``[start, end]`` (ties broken by doctor id).
+
+    Slots held by the user ``user_id`` count as free to them. Doctors without
+    a free slot in the window are left out.
+    """
+    doctors = Doctor.objects.filter(is_available=True)
+    if specialization:
+        doctors = doctors.filter(specialization=specialization)
+    doctor_ids = doctors.values('id')
+
+    slot_ids = _slot_ids()
+    present_mask = sum(1 << index for index, slot_id in enumerate(slot_ids) if slot_id is not None)
+
+    weekday_masks = {
+        doctor_id: [mask & present_mask for mask in week]
+        for doctor_id, week in week_matrices(doctor_ids).items()
+    }
+    if not weekday_masks:
+        return []
+
+    # Booked and held slots of every candidate, one row per (doctor, date);
+    # both tables allow one row per slot, so summing the bits gives the mask
+    taken = {}
+    booked = Appointment.objects.filter(
+        doctor__in=doctor_ids,
+        appointment_date__range=(start, end),
+        status__in=ACTIVE_STATUSES
+    ).order_by().values('doctor', 'appointment_date').annotate(
+        mask=_booked_mask_expression()
+    ).values_list('doctor', 'appointment_date', 'mask')
+    for doctor_id, day, mask in booked:
+        taken[doctor_id, day] = mask
+
+    holds = SlotHold.objects.filter(
+        doctor__in=doctor_ids,
+        appointment_date__range=(start, end),
+        expires_at__gt=timezone.now()
+    )
+    if user_id is not None:
+        holds = holds.exclude(patient__user_id=user_id)
+    held = holds.order_by().values('doctor', 'appointment_date').annotate(
+        mask=_booked_mask_expression()
+    ).values_list('doctor', 'appointment_date', 'mask')
+    for doctor_id, day, mask in held:
+        taken[doctor_id, day] = taken.get((doctor_id, day), 0) | mask
+
+    days = date_range(start, end)
+    first_day_mask = past_mask(start)
+    streams = [
+        _free_slot_stream(doctor_id, masks, taken, days, first_day_mask)
+        for doctor_id, masks in weekday_masks.items()
+    ]
+
+    earliest = []
+    seen = set()
+    for day, index, doctor_id in heapq.merge(*streams):
+        if doctor_id in seen:
+            continue
+        seen.add(doctor_id)
+        earliest.append((doctor_id, day, index))
+        if len(earliest) == limit or len(seen) == len(streams):
+            break
+
+    found = Doctor.objects.select_related('user').in_bulk([doctor_id for doctor_id, day, index in earliest])
+    return [
+        (found[doctor_id], day, index, slot_ids[index])
+        for doctor_id, day, index in earliest
+        if doctor_id in found
+    ]
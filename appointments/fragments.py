@@ -0,0 +1,62 @@
+"""
+Cache keys for the dashboard template fragments.
+
+The dashboards cache their stats cards and appointment lists with
+``{% cache %}``, varied on ``key(kind, pk)``. The key combines the doctor's
+or patient's appointments version with a clock.
+
+- The version lives in the cache. It is bumped (on commit) whenever one of
+  their appointments is saved or deleted (see ``signals``) and after bulk
+  imports, so a booking, cancellation or status change makes the old
+  fragments unreachable. A missing version is recreated from the current
+  time, not from zero, so an evicted counter never revives fragments cached
+  under an earlier value.
+- The clock is the local date plus the number of slots that have started
+  today. Date-relative counts and the "Cancel" buttons (``can_cancel``)
+  change at exactly those moments.
+
+Stale fragments are never read again and age out after
+``FRAGMENT_CACHE_SECONDS``. The versions only reach every worker through a
+shared cache (``REDIS_URL`` in the settings); with the per-process fallback
+a booking handled by one process leaves the others' fragments in place.
+"""
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import SLOT_MINUTES
+
+
+_SLOT_STARTS = sorted(minutes * 60 for minutes in SLOT_MINUTES.values())
+
+
+def _version_key(kind, pk):
+    return f'appointments:fragments:version:{kind}:{pk}'
+
+
+def _fresh_version():
+    return time.time_ns()
+
+
+def bump(kind, pk):
+    """Invalidate the cached fragments of one doctor (``kind='doctor'``) or patient."""
+    version_key = _version_key(kind, pk)
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, _fresh_version(), None)
+
+
+def clock():
+    now = timezone.localtime()
+    seconds = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
+    # Slots whose start is strictly before now, matching Appointment.is_past
+    return f'{now.date().isoformat()}.{bisect_left(_SLOT_STARTS, seconds)}'
+
+
+def key(kind, pk):
+    """Return the value to vary the fragments of one doctor or patient on."""
+    version = cache.get_or_set(_version_key(kind, pk), _fresh_version, None)
+    return f'{kind}:{pk}:{version}:{clock()}'
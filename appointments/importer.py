@@ -0,0 +1,205 @@
+"""
+Bulk import of historical appointments.
+
+Rows come from CSV (with a header) or JSON Lines, with the fields in
+``FIELDS``: the doctor's license number, the patient's username, the date
+(``YYYY-MM-DD``), the slot start (``HH:MM``) and optionally the status,
+symptoms and notes. Doctors, patients and time slots are resolved through
+maps loaded once up front, and each chunk of rows is checked against the
+``(doctor, appointment_date, appointment_time)`` constraint with one query,
+then written with ``bulk_create`` in its own transaction together with its
+``AppointmentHistory`` rows.
+
+``bulk_create`` skips the signals and services, so ``finish`` recounts the
+dashboard counters of the doctors and patients touched and drops their
+cached availability and dashboard fragments. Call it even when a later chunk
+fails, since the chunks before it stay committed.
+"""
+import csv
+import json
+from datetime import date
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import Doctor, Patient
+from . import availability, fragments, stats, timeslots
+from .models import Appointment, AppointmentHistory, DoctorStats, PatientStats
+
+
+FIELDS = ('doctor', 'patient', 'date', 'time', 'status', 'symptoms', 'notes')
+
+STATUSES = {value for value, label in Appointment.STATUS_CHOICES}
+
+# Doctors per existing-slot lookup in ``Importer._taken``
+TAKEN_BATCH_DOCTORS = 200
+
+
+class RowError(Exception):
+    """A row that cannot be imported; the message says why."""
+
+
+def read_rows(stream, format):
+    """Yield ``(line_number, row_dict)`` from a CSV or JSON Lines text stream."""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f'invalid JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError('expected a JSON object')
+            continue
+        yield line_number, row
+
+
+def chunked(rows, size):
+    """Split an iterable into lists of at most ``size`` items."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Importer:
+    """
+    Import chunks of rows, remembering what was touched for ``finish``.
+
+    History rows are attributed to ``changed_by`` or, when it is ``None``,
+    to the patient's user.
+    """
+
+    def __init__(self, batch_size=1000, changed_by=None, default_status='completed'):
+        self.batch_size = batch_size
+        self.changed_by = changed_by
+        self.default_status = default_status
+        self.doctors = dict(Doctor.objects.values_list('license_number', 'id'))
+        self.patients = {
+            username: (patient_id, user_id)
+            for patient_id, user_id, username in Patient.objects.values_list('id', 'user_id', 'user__username')
+        }
+        self.doctor_ids = set()
+        self.patient_ids = set()
+        self.imported = 0
+
+    def parse(self, row):
+        if isinstance(row, RowError):
+            raise row
+        row = {field: (row.get(field) or '') for field in FIELDS}
+        row = {field: str(value).strip() for field, value in row.items()}
+
+        doctor_id = self.doctors.get(row['doctor'])
+        if doctor_id is None:
+            raise RowError(f"unknown doctor license number {row['doctor']!r}")
+        patient = self.patients.get(row['patient'])
+        if patient is None:
+            raise RowError(f"unknown patient username {row['patient']!r}")
+        try:
+            appointment_date = date.fromisoformat(row['date'])
+        except ValueError:
+            raise RowError(f"invalid date {row['date']!r}, expected YYYY-MM-DD")
+        slot = timeslots.get_slot_by_time(row['time'])
+        if slot is None:
+            raise RowError(f"unknown time slot {row['time']!r}")
+        status = row['status'] or self.default_status
+        if status not in STATUSES:
+            raise RowError(f'unknown status {status!r}')
+
+        patient_id, user_id = patient
+        appointment = Appointment(
+            doctor_id=doctor_id,
+            patient_id=patient_id,
+            appointment_date=appointment_date,
+            appointment_time_id=slot.id,
+            start_minute=slot.minutes,
+            status=status,
+            symptoms=row['symptoms'],
+            notes=row['notes'],
+        )
+        return appointment, user_id
+
+    def _taken(self, appointments):
+        """Return the slot keys among ``appointments`` that already exist."""
+        days = {}
+        for appointment in appointments:
+            days.setdefault(appointment.doctor_id, set()).add(appointment.appointment_date)
+        # Only the exact (doctor, date) pairs of the chunk, so an unsorted
+        # file does not re-read every day between its earliest and latest
+        # date; batched to keep each OR within SQLite's expression depth
+        doctors = list(days.items())
+        taken = set()
+        for start in range(0, len(doctors), TAKEN_BATCH_DOCTORS):
+            pairs = Q()
+            for doctor_id, dates in doctors[start:start + TAKEN_BATCH_DOCTORS]:
+                pairs |= Q(doctor_id=doctor_id, appointment_date__in=dates)
+            taken.update(
+                Appointment.objects.filter(pairs).values_list('doctor_id', 'appointment_date', 'appointment_time_id')
+            )
+        return taken
+
+    def import_chunk(self, rows):
+        """
+        Validate and write one chunk of ``(line_number, row)`` pairs in a
+        single transaction. Returns a list of ``(line_number, message)``
+        for the rows that were skipped.
+        """
+        errors = []
+        parsed = []
+        for line_number, row in rows:
+            try:
+                parsed.append((line_number, *self.parse(row)))
+            except RowError as e:
+                errors.append((line_number, str(e)))
+        if not parsed:
+            return errors
+
+        taken = self._taken([appointment for line_number, appointment, user_id in parsed])
+        appointments = []
+        changed_by = []
+        for line_number, appointment, user_id in parsed:
+            key = (appointment.doctor_id, appointment.appointment_date, appointment.appointment_time_id)
+            if key in taken:
+                errors.append((line_number, 'slot already booked for this doctor'))
+                continue
+            taken.add(key)
+            appointments.append(appointment)
+            changed_by.append(self.changed_by.pk if self.changed_by else user_id)
+
+        with transaction.atomic():
+            created = Appointment.objects.bulk_create(appointments, batch_size=self.batch_size)
+            AppointmentHistory.objects.bulk_create([
+                AppointmentHistory(
+                    appointment_id=appointment.pk,
+                    changed_by_id=user_id,
+                    old_status='',
+                    new_status=appointment.status,
+                    change_reason='Imported appointment'
+                )
+                for appointment, user_id in zip(created, changed_by)
+            ], batch_size=self.batch_size)
+
+        self.imported += len(created)
+        self.doctor_ids.update(appointment.doctor_id for appointment in created)
+        self.patient_ids.update(appointment.patient_id for appointment in created)
+        return errors
+
+    def finish(self):
+        """Bring the counters and availability caches in line with the import."""
+        for doctor_id in self.doctor_ids:
+            stats.rebuild(DoctorStats, doctor_id)
+            availability.invalidate_doctor(doctor_id)
+            fragments.bump('doctor', doctor_id)
+        for patient_id in self.patient_ids:
+            stats.rebuild(PatientStats, patient_id)
+            fragments.bump('patient', patient_id)
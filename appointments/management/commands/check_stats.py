@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments import stats
+from appointments.models import DoctorStats, PatientStats
+
+
+class Command(BaseCommand):
+    help = 'Compare the dashboard counters against a full recount of appointments'
+
+    def handle(self, *args, **options):
+        problems = 0
+        for model in (DoctorStats, PatientStats):
+            for pk, field, stored, actual in stats.check(model):
+                problems += 1
+                self.stdout.write(f'{model.__name__} {pk}: {field} is {stored}, expected {actual}')
+
+        if problems:
+            raise CommandError(f'{problems} counters differ from the recount; run rebuild_stats to fix them')
+        self.stdout.write(self.style.SUCCESS('All counters match'))
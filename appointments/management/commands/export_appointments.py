@@ -0,0 +1,49 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+
+from accounts.models import Doctor
+from appointments import exports
+from appointments.models import Appointment
+from medibook.routers import replica_reads
+
+
+class Command(BaseCommand):
+    help = 'Stream appointments to a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', help="License number of the doctor to export (default: every doctor)")
+        parser.add_argument('--format', choices=list(exports.FORMATS), default='csv')
+        parser.add_argument('--start', type=date.fromisoformat, help='First date to export (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last date to export (YYYY-MM-DD)')
+        parser.add_argument('--output', default='-', help="File to write, or '-' for standard output")
+
+    def handle(self, *args, **options):
+        doctor = None
+        if options['doctor']:
+            try:
+                doctor = Doctor.objects.get(license_number=options['doctor'])
+            except Doctor.DoesNotExist:
+                raise CommandError(f"Unknown doctor license number {options['doctor']!r}")
+
+        with replica_reads():
+            database = router.db_for_read(Appointment)
+        appointments = exports.appointments_for(doctor, options['start'], options['end']).using(database)
+        lines = exports.export_lines(appointments, options['format'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        written = 0
+        try:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(line)
+                    written += 1
+        except OSError as e:
+            raise CommandError(f"Cannot write {options['output']}: {e}")
+        if options['format'] == 'csv':
+            written -= 1  # header
+        self.stdout.write(self.style.SUCCESS(f"Exported {written} appointments to {options['output']}"))
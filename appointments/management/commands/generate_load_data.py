@@ -0,0 +1,201 @@
+import random
+import time
+from collections import Counter
+from datetime import date, time as dt_time, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from faker import Faker
+
+from accounts.models import User, Doctor, Patient
+from appointments import availability, directory, search, timeslots
+from appointments.models import Appointment, DoctorAvailability, DoctorStats, PatientStats, TimeSlot
+from appointments.stats import COUNTED_STATUSES, STATUS_FIELDS
+
+
+PAST_STATUSES = (['completed'] * 8) + ['cancelled', 'no_show']
+FUTURE_STATUSES = (['pending'] * 3) + ['confirmed'] * 6 + ['cancelled']
+
+
+class Command(BaseCommand):
+    help = 'Generate doctors, patients, schedules and appointments for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=100)
+        parser.add_argument('--patients', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=30,
+                            help='Days of appointments, centred on --start')
+        parser.add_argument('--start', type=date.fromisoformat, default=None,
+                            help='Middle of the generated period (default: today)')
+        parser.add_argument('--fill', type=float, default=0.6,
+                            help='Share of open slots that get booked')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per INSERT and per transaction')
+        parser.add_argument('--prefix', default='load',
+                            help='Prefix of the generated usernames and license numbers')
+        parser.add_argument('--password', default='loadtest123',
+                            help='Password of every generated user')
+
+    def handle(self, *args, **options):
+        if options['doctors'] < 1 or options['patients'] < 1 or options['days'] < 1:
+            raise CommandError('--doctors, --patients and --days must be positive')
+        if not 0 <= options['fill'] <= 1:
+            raise CommandError('--fill must be between 0 and 1')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Users prefixed '{prefix}_' already exist; pass another --prefix")
+
+        self.batch_size = options['batch_size']
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('en_IN')
+        self.fake.seed_instance(options['seed'])
+        # Hashing is deliberately slow; every generated user shares one hash
+        self.password = make_password(options['password'])
+        started = time.perf_counter()
+
+        for value, label in TimeSlot.TIME_CHOICES:
+            TimeSlot.objects.get_or_create(time=value)
+
+        doctors = self.create_doctors(prefix, options['doctors'])
+        patients = self.create_patients(prefix, options['patients'])
+        self.stdout.write(f'Created {len(doctors)} doctors and {len(patients)} patients')
+
+        start = (options['start'] or date.today()) - timedelta(days=options['days'] // 2)
+        days = availability.date_range(start, start + timedelta(days=options['days'] - 1))
+        weeks = self.create_schedules(doctors)
+        created = self.create_appointments(weeks, patients, days, options['fill'], started)
+
+        search.rebuild()
+        directory.invalidate()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {created} appointments in {elapsed:.1f}s ({created / elapsed:.0f} rows/s)'
+        ))
+
+    def bulk_create(self, model, rows):
+        """Insert ``rows`` in batches, one transaction per batch, and return them."""
+        rows = iter(rows)
+        created = []
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return created
+            with transaction.atomic():
+                created.extend(model.objects.bulk_create(batch))
+
+    def users(self, prefix, kind, count):
+        fake = self.fake
+        for number in range(count):
+            first_name = fake.first_name()
+            last_name = fake.last_name()
+            yield User(
+                username=f'{prefix}_{kind}{number}',
+                email=f'{prefix}_{kind}{number}@example.com',
+                first_name=first_name,
+                last_name=last_name,
+                phone=fake.numerify('9#########'),
+                user_type=kind,
+                password=self.password
+            )
+
+    def create_doctors(self, prefix, count):
+        specializations = [value for value, label in Doctor.SPECIALIZATION_CHOICES]
+        users = self.bulk_create(User, self.users(prefix, 'doctor', count))
+        return self.bulk_create(Doctor, (
+            Doctor(
+                user=user,
+                specialization=self.rng.choice(specializations),
+                license_number=f'{prefix.upper()}-{number:07d}',
+                experience_years=self.rng.randint(1, 35),
+                consultation_fee=self.rng.randrange(300, 3000, 50),
+                bio=self.fake.sentence(nb_words=12)
+            )
+            for number, user in enumerate(users)
+        ))
+
+    def create_patients(self, prefix, count):
+        genders = [value for value, label in Patient.GENDER_CHOICES]
+        users = self.bulk_create(User, self.users(prefix, 'patient', count))
+        return self.bulk_create(Patient, (
+            Patient(user=user, gender=self.rng.choice(genders))
+            for user in users
+        ))
+
+    def create_schedules(self, doctors):
+        """Give every doctor a few random weekly windows; return their week matrices."""
+        rows = []
+        weeks = {}
+        for doctor in doctors:
+            windows = []
+            for weekday in sorted(self.rng.sample(range(7), self.rng.randint(3, 6))):
+                start_hour = self.rng.randint(9, 14)
+                windows.append((weekday, dt_time(start_hour), dt_time(self.rng.randint(start_hour + 1, 19))))
+            rows.extend(
+                DoctorAvailability(doctor=doctor, weekday=weekday, start_time=start_time, end_time=end_time)
+                for weekday, start_time, end_time in windows
+            )
+            weeks[doctor.pk] = availability.week_matrix(windows)
+        self.bulk_create(DoctorAvailability, rows)
+        return weeks
+
+    def create_appointments(self, weeks, patients, days, fill, started):
+        """
+        Book a ``fill`` share of every open slot and write the matching
+        dashboard counters directly, since ``bulk_create`` skips the services.
+        """
+        slot_by_index = [timeslots.get_slot_by_time(value) for value in availability.SLOT_TIMES]
+        patient_ids = [patient.pk for patient in patients]
+        today = date.today()
+        doctor_counts = {doctor_id: Counter() for doctor_id in weeks}
+        patient_counts = {patient_id: Counter() for patient_id in patient_ids}
+        doctor_patients = {doctor_id: set() for doctor_id in weeks}
+        rng = self.rng
+
+        def appointments():
+            for doctor_id, week in weeks.items():
+                for day, open_mask in zip(days, availability.project_week(week, days)):
+                    statuses = PAST_STATUSES if day < today else FUTURE_STATUSES
+                    for index in availability.mask_to_indexes(open_mask):
+                        if rng.random() >= fill:
+                            continue
+                        patient_id = rng.choice(patient_ids)
+                        status = rng.choice(statuses)
+                        doctor_counts[doctor_id][STATUS_FIELDS[status]] += 1
+                        patient_counts[patient_id][STATUS_FIELDS[status]] += 1
+                        if status in COUNTED_STATUSES:
+                            doctor_patients[doctor_id].add(patient_id)
+                        slot = slot_by_index[index]
+                        yield Appointment(
+                            doctor_id=doctor_id,
+                            patient_id=patient_id,
+                            appointment_date=day,
+                            appointment_time_id=slot.pk,
+                            start_minute=slot.minutes,
+                            status=status
+                        )
+
+        created = 0
+        rows = appointments()
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                Appointment.objects.bulk_create(batch)
+            created += len(batch)
+            if created % (self.batch_size * 20) < self.batch_size:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{created} appointments ({created / elapsed:.0f} rows/s)')
+
+        self.bulk_create(DoctorStats, (
+            DoctorStats(doctor_id=doctor_id, total_patients=len(doctor_patients[doctor_id]), **counts)
+            for doctor_id, counts in doctor_counts.items()
+        ))
+        self.bulk_create(PatientStats, (
+            PatientStats(patient_id=patient_id, **counts)
+            for patient_id, counts in patient_counts.items()
+        ))
+        return created
@@ -0,0 +1,75 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from appointments import importer
+
+
+class Command(BaseCommand):
+    help = 'Import historical appointments from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per INSERT statement')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Rows per transaction')
+        parser.add_argument('--changed-by',
+                            help="Username recorded in the history rows (default: each appointment's patient)")
+        parser.add_argument('--default-status', default='completed', choices=sorted(importer.STATUSES),
+                            help='Status of rows that leave it empty')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format']
+        if format is None:
+            if path.endswith('.csv'):
+                format = 'csv'
+            elif path.endswith(('.jsonl', '.ndjson')):
+                format = 'jsonl'
+            else:
+                raise CommandError('Cannot tell the format from the file name; pass --format')
+        if options['batch_size'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--batch-size and --chunk-size must be positive')
+
+        changed_by = None
+        if options['changed_by']:
+            try:
+                changed_by = User.objects.get(username=options['changed_by'])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user {options['changed_by']!r}")
+
+        load = importer.Importer(
+            batch_size=options['batch_size'],
+            changed_by=changed_by,
+            default_status=options['default_status']
+        )
+        skipped = 0
+        started = time.perf_counter()
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e}')
+        try:
+            rows = importer.read_rows(stream, format)
+            for chunk in importer.chunked(rows, options['chunk_size']):
+                for line_number, message in load.import_chunk(chunk):
+                    skipped += 1
+                    self.stderr.write(f'Line {line_number}: {message}')
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{load.imported} imported, {skipped} skipped ({load.imported / elapsed:.0f} rows/s)')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            # Earlier chunks are committed even if a later one failed
+            load.finish()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {load.imported} appointments, skipped {skipped}, '
+            f'in {elapsed:.1f}s ({load.imported / elapsed:.0f} rows/s)'
+        ))
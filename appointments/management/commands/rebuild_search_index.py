@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from appointments import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text doctor search index'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write('Full-text search needs SQLite FTS5; nothing to rebuild')
+            return
+        with transaction.atomic():
+            indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} doctors'))
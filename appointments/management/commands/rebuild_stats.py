@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from appointments import stats
+from appointments.models import DoctorStats, PatientStats
+
+
+class Command(BaseCommand):
+    help = 'Recount the doctor and patient dashboard counters from appointments'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            doctors = stats.rebuild(DoctorStats)
+            patients = stats.rebuild(PatientStats)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt counters for {doctors} doctors and {patients} patients'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from appointments.services import sweep_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Delete expired slot holds'
+
+    def handle(self, *args, **options):
+        deleted = sweep_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f'Removed {deleted} expired slot holds'))
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    # FTS5 is SQLite-only; other databases use the icontains fallback
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE appointments_doctor_search USING fts5("
+        "name, specialization, bio, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    Doctor = apps.get_model('accounts', 'Doctor')
+    labels = dict(Doctor._meta.get_field('specialization').choices)
+    for doctor in Doctor.objects.select_related('user').iterator():
+        schema_editor.execute(
+            "INSERT INTO appointments_doctor_search (rowid, name, specialization, bio) VALUES (%s, %s, %s, %s)",
+            [
+                doctor.pk,
+                f"{doctor.user.first_name} {doctor.user.last_name}",
+                labels.get(doctor.specialization, doctor.specialization),
+                doctor.bio,
+            ]
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS appointments_doctor_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('appointments', '0004_appointment_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:28
+
+from django.db import migrations, models
+
+
+def fill_start_minute(apps, schema_editor):
+    # One UPDATE per time slot rather than one per appointment
+    TimeSlot = apps.get_model('appointments', 'TimeSlot')
+    Appointment = apps.get_model('appointments', 'Appointment')
+    for slot in TimeSlot.objects.all():
+        hours, minutes = slot.time.split(':')
+        Appointment.objects.filter(appointment_time=slot).update(start_minute=int(hours) * 60 + int(minutes))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_doctor_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='start_minute',
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_start_minute, migrations.RunPython.noop),
+    ]
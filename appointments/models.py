@@ -1,8 +1,8 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.utils.functional import cached_property
 from accounts.models import User, Doctor, Patient
-from datetime import datetime, time
 
 
 class TimeSlot(models.Model):
@@ -29,6 +29,18 @@ class TimeSlot(models.Model):
     
     def __str__(self):
         return self.get_time_display()
+    
+    @property
+    def minutes(self):
+        """Start of the slot in minutes since midnight."""
+        return SLOT_MINUTES[self.time]
+
+
+# Slot start in minutes since midnight, keyed by ``TimeSlot.time``
+SLOT_MINUTES = {
+    value: int(value[:2]) * 60 + int(value[3:])
+    for value, label in TimeSlot.TIME_CHOICES
+}
 
 
 class DoctorAvailability(models.Model):
@@ -72,6 +84,9 @@ class Appointment(models.Model):
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='appointments')
     appointment_date = models.DateField()
     appointment_time = models.ForeignKey(TimeSlot, on_delete=models.CASCADE)
+    # Copy of appointment_time's start in minutes since midnight, so time
+    # checks need neither the TimeSlot row nor string parsing
+    start_minute = models.PositiveSmallIntegerField(null=True, editable=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     symptoms = models.TextField(blank=True)
     notes = models.TextField(blank=True)
@@ -81,6 +96,35 @@ class Appointment(models.Model):
     class Meta:
         unique_together = ('doctor', 'appointment_date', 'appointment_time')
         ordering = ['-appointment_date', '-appointment_time']
+        indexes = [
+            # Patient dashboard: lists seek by patient and walk the date/time
+            # order, and carrying status lets the counters read the index only
+            models.Index(
+                fields=['patient', 'appointment_date', 'appointment_time', 'status'],
+                name='appt_patient_date_time_idx',
+            ),
+            # Doctor dashboard and slot availability only look at active rows
+            models.Index(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                name='appt_doctor_active_idx',
+                condition=models.Q(status__in=['pending', 'confirmed']),
+            ),
+            # Distinct-patient bookkeeping in appointments.stats
+            models.Index(
+                fields=['doctor', 'patient', 'status'],
+                name='appt_doctor_patient_idx',
+            ),
+            # Exports stream in (date, start) order straight off these, per
+            # doctor or for everyone, without sorting the result first
+            models.Index(
+                fields=['doctor', 'appointment_date', 'start_minute'],
+                name='appt_doctor_date_start_idx',
+            ),
+            models.Index(
+                fields=['appointment_date', 'start_minute'],
+                name='appt_date_start_idx',
+            ),
+        ]
     
     def clean(self):
         # Simple validation - just check if appointment is in the future
@@ -90,16 +134,31 @@ class Appointment(models.Model):
     def __str__(self):
         return f"{self.patient.user.first_name} - Dr. {self.doctor.user.first_name} ({self.appointment_date})"
     
+    def save(self, *args, **kwargs):
+        # Derived from the slot id on every save: assigning
+        # appointment_time_id drops the cached TimeSlot, so its presence
+        # says nothing about whether the slot changed
+        self.start_minute = self.slot.minutes
+        super().save(*args, **kwargs)
+    
     @property
+    def slot(self):
+        """The appointment's ``TimeSlot``, from the in-process registry when possible."""
+        if Appointment.appointment_time.is_cached(self):
+            return self.appointment_time
+        from . import timeslots
+        return timeslots.get_slot(self.appointment_time_id) or self.appointment_time
+    
+    @cached_property
     def is_past(self):
-        from django.utils import timezone as tz
-        appointment_datetime = datetime.combine(
-            self.appointment_date,
-            datetime.strptime(self.appointment_time.time, '%H:%M').time()
-        )
-        # Make it timezone aware
-        appointment_datetime = tz.make_aware(appointment_datetime)
-        return appointment_datetime < tz.now()
+        now = timezone.localtime()
+        if self.appointment_date != now.date():
+            return self.appointment_date < now.date()
+        if self.start_minute is None:
+            start_minute = self.slot.minutes
+        else:
+            start_minute = self.start_minute
+        return start_minute * 60 < now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
     
     @property
     def can_cancel(self):
@@ -119,3 +178,55 @@ class AppointmentHistory(models.Model):
     
     def __str__(self):
         return f"{self.appointment} - {self.old_status} to {self.new_status}"
+
+
+class SlotHold(models.Model):
+    """A short-lived reservation taken while a patient completes a booking."""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='slot_holds')
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='slot_holds')
+    appointment_date = models.DateField()
+    appointment_time = models.ForeignKey(TimeSlot, on_delete=models.CASCADE)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('doctor', 'appointment_date', 'appointment_time')
+    
+    def __str__(self):
+        return f"{self.patient} holds Dr. {self.doctor.user.first_name} ({self.appointment_date})"
+    
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+
+class AppointmentCounters(models.Model):
+    """Per-status appointment counters maintained by the booking services."""
+    pending_count = models.IntegerField(default=0)
+    confirmed_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    no_show_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        abstract = True
+    
+    @property
+    def total_appointments(self):
+        return self.pending_count + self.confirmed_count + self.completed_count
+
+
+class DoctorStats(AppointmentCounters):
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_patients = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"Stats for Dr. {self.doctor.user.first_name}"
+
+
+class PatientStats(AppointmentCounters):
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    
+    def __str__(self):
+        return f"Stats for {self.patient}"
@@ -0,0 +1,124 @@
+"""
+Full-text doctor search.
+
+On SQLite the doctors' names, specialization labels and bios are mirrored
+into the ``appointments_doctor_search`` FTS5 table (created by migration
+0005), keyed by doctor id. Signals keep it in step with ``Doctor`` and
+``User`` changes, and queries are ranked with bm25 so name matches outrank
+specialization matches, which outrank bio matches. Every term is matched as
+a prefix, so "car" finds "Cardiology". Other databases fall back to
+``icontains`` lookups.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from accounts.models import Doctor
+
+
+TABLE = 'appointments_doctor_search'
+
+# bm25 weights for the name, specialization and bio columns
+WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def _document(doctor):
+    return (
+        f"{doctor.user.first_name} {doctor.user.last_name}",
+        doctor.get_specialization_display(),
+        doctor.bio,
+    )
+
+
+def index_doctor(doctor):
+    """Add or refresh one doctor's entry in the search table."""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [doctor.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, name, specialization, bio) VALUES (%s, %s, %s, %s)',
+            [doctor.pk, *_document(doctor)]
+        )
+
+
+def remove_doctor(doctor_id):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [doctor_id])
+
+
+def rebuild():
+    """Re-index every doctor and return how many were indexed."""
+    if not is_supported():
+        return 0
+    doctors = Doctor.objects.select_related('user')
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, specialization, bio) VALUES (%s, %s, %s, %s)',
+            [(doctor.pk, *_document(doctor)) for doctor in doctors.iterator(chunk_size=2000)]
+        )
+    return doctors.count()
+
+
+def _match_expression(query):
+    """Turn free text into an FTS5 query matching every term as a prefix."""
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_ids(query, limit, specialization=None, available_only=False):
+    """
+    Return the ids of the best matching doctors, best first. The
+    specialization and availability filters are applied in the same query,
+    before the ranking is cut off at ``limit``.
+    """
+    expression = _match_expression(query)
+    if not expression:
+        return []
+    doctors = Doctor._meta.db_table
+    conditions, params = [f'{TABLE} MATCH %s'], [expression]
+    if specialization:
+        conditions.append(f'{doctors}.specialization = %s')
+        params.append(specialization)
+    if available_only:
+        conditions.append(f'{doctors}.is_available')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {TABLE}.rowid FROM {TABLE} JOIN {doctors} ON {doctors}.id = {TABLE}.rowid '
+            f'WHERE {" AND ".join(conditions)} '
+            f'ORDER BY bm25({TABLE}, %s, %s, %s) LIMIT %s',
+            [*params, *WEIGHTS, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(query, specialization=None, limit=20):
+    """
+    Return up to ``limit`` available doctors matching ``query``, best match
+    first, optionally restricted to one specialization.
+    """
+    doctors = Doctor.objects.filter(is_available=True).select_related('user')
+    if specialization:
+        doctors = doctors.filter(specialization=specialization)
+
+    if not is_supported():
+        for term in query.split():
+            doctors = doctors.filter(
+                Q(user__first_name__icontains=term)
+                | Q(user__last_name__icontains=term)
+                | Q(bio__icontains=term)
+                | Q(specialization__icontains=term)
+            )
+        return list(doctors.order_by('id')[:limit])
+
+    ids = search_ids(query, limit, specialization=specialization, available_only=True)
+    found = doctors.in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
@@ -0,0 +1,210 @@
+"""
+Booking operations that must stay consistent under concurrent requests.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import availability, fragments, stats
+from .availability import ACTIVE_STATUSES
+from .models import Appointment, AppointmentHistory, DoctorAvailability, SlotHold
+
+
+class SlotUnavailable(Exception):
+    """The requested doctor/date/time slot is already taken."""
+
+
+class SlotClosed(SlotUnavailable):
+    """The doctor does not see patients at the requested date and time."""
+
+
+def _check_open(doctor, appointment_date, appointment_time):
+    """
+    Raise ``SlotClosed`` unless the doctor is available and the slot falls in
+    their availability window for that weekday. Read inside the booking or
+    hold transaction, so a schedule change cannot slip between check and write.
+    """
+    windows = DoctorAvailability.objects.filter(
+        doctor=doctor,
+        doctor__is_available=True,
+        weekday=appointment_date.weekday(),
+        is_available=True
+    ).values_list('start_time', 'end_time')
+    index = availability.SLOT_INDEX.get(appointment_time.time)
+    if index is None or not any(availability.window_mask(start, end) >> index & 1 for start, end in windows):
+        raise SlotClosed()
+
+
+def book_slot(patient, doctor, appointment_date, appointment_time, symptoms, changed_by):
+    """
+    Book a slot for ``patient`` and log it in ``AppointmentHistory``.
+
+    The insert is attempted first and the ``unique_together`` constraint on
+    ``(doctor, appointment_date, appointment_time)`` decides who wins a race.
+    On a conflict the existing row is locked and, if it was cancelled,
+    rebooked. A lost race is retried once before giving up.
+
+    A slot held by another patient is unavailable until the hold expires;
+    the patient's own hold on the slot is consumed by the booking.
+
+    Returns ``(appointment, rebooked)``; raises ``SlotUnavailable`` if the
+    slot is taken by an active appointment or another patient's hold, and
+    ``SlotClosed`` if it is outside the doctor's availability.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                return _book_slot(patient, doctor, appointment_date, appointment_time, symptoms, changed_by)
+        except (IntegrityError, Appointment.DoesNotExist):
+            # Another request inserted or removed the row between our insert
+            # and our lock; the second pass sees the settled state
+            if attempt:
+                raise SlotUnavailable()
+
+
+def _book_slot(patient, doctor, appointment_date, appointment_time, symptoms, changed_by):
+    _check_open(doctor, appointment_date, appointment_time)
+    hold = SlotHold.objects.select_for_update().filter(
+        doctor=doctor,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time
+    ).first()
+    if hold is not None:
+        if hold.patient_id != patient.pk and not hold.is_expired:
+            raise SlotUnavailable()
+        hold.delete()
+
+    try:
+        with transaction.atomic():
+            appointment = Appointment.objects.create(
+                patient=patient,
+                doctor=doctor,
+                appointment_date=appointment_date,
+                appointment_time=appointment_time,
+                symptoms=symptoms
+            )
+    except IntegrityError:
+        appointment = None
+
+    if appointment is not None:
+        stats.record_transition(appointment, '')
+        AppointmentHistory.objects.create(
+            appointment=appointment,
+            changed_by=changed_by,
+            old_status='',
+            new_status='pending',
+            change_reason='New appointment created'
+        )
+        return appointment, False
+
+    existing = Appointment.objects.select_for_update().get(
+        doctor=doctor,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time
+    )
+    if existing.status in ACTIVE_STATUSES:
+        raise SlotUnavailable()
+
+    # Reuse the cancelled appointment instead of creating a new one
+    old_status = existing.status
+    old_patient_id = existing.patient_id
+    existing.patient = patient
+    existing.status = 'pending'
+    existing.symptoms = symptoms
+    existing.notes = ''  # Clear any previous notes
+    existing.save()
+    stats.record_transition(existing, old_status, old_patient_id)
+    # The save signal covers the new patient; the old one loses the row
+    transaction.on_commit(lambda: fragments.bump('patient', old_patient_id))
+
+    AppointmentHistory.objects.create(
+        appointment=existing,
+        changed_by=changed_by,
+        old_status=old_status,
+        new_status='pending',
+        change_reason='Appointment rebooked after cancellation'
+    )
+    return existing, True
+
+
+def cancel_appointment(appointment, changed_by):
+    """
+    Cancel an active appointment and log it. Returns ``False`` if the
+    appointment is no longer active.
+    """
+    with transaction.atomic():
+        appointment = Appointment.objects.select_for_update().get(pk=appointment.pk)
+        if appointment.status not in ACTIVE_STATUSES:
+            return False
+
+        old_status = appointment.status
+        appointment.status = 'cancelled'
+        appointment.save()
+        stats.record_transition(appointment, old_status)
+
+        AppointmentHistory.objects.create(
+            appointment=appointment,
+            changed_by=changed_by,
+            old_status=old_status,
+            new_status='cancelled',
+            change_reason='Appointment cancelled by user'
+        )
+    return True
+
+
+def update_appointment_status(appointment, new_status):
+    """Set an appointment's status and keep the counters in step."""
+    with transaction.atomic():
+        appointment = Appointment.objects.select_for_update().get(pk=appointment.pk)
+        old_status = appointment.status
+        appointment.status = new_status
+        appointment.save()
+        stats.record_transition(appointment, old_status)
+    return appointment
+
+
+def hold_slot(patient, doctor, appointment_date, appointment_time):
+    """
+    Reserve a slot for ``patient`` for ``SLOT_HOLD_SECONDS``.
+
+    Holding a slot again refreshes the hold, and a patient holds at most one
+    slot per doctor, so picking another slot releases the previous one.
+    Raises ``SlotUnavailable`` if the slot is booked or held by someone else,
+    and ``SlotClosed`` if it is outside the doctor's availability.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.SLOT_HOLD_SECONDS)
+    slot = dict(doctor=doctor, appointment_date=appointment_date, appointment_time=appointment_time)
+
+    with transaction.atomic():
+        _check_open(doctor, appointment_date, appointment_time)
+        if Appointment.objects.filter(status__in=ACTIVE_STATUSES, **slot).exists():
+            raise SlotUnavailable()
+
+        SlotHold.objects.filter(expires_at__lte=now, **slot).delete()
+        SlotHold.objects.filter(doctor=doctor, patient=patient).exclude(
+            appointment_date=appointment_date,
+            appointment_time=appointment_time
+        ).delete()
+
+        hold = SlotHold.objects.select_for_update().filter(**slot).first()
+        if hold is None:
+            try:
+                with transaction.atomic():
+                    return SlotHold.objects.create(patient=patient, expires_at=expires_at, **slot)
+            except IntegrityError:
+                raise SlotUnavailable()
+
+        if hold.patient_id != patient.pk:
+            raise SlotUnavailable()
+        hold.expires_at = expires_at
+        hold.save()
+        return hold
+
+
+def sweep_expired_holds():
+    """Delete every expired hold and return how many were removed."""
+    deleted, _ = SlotHold.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.models import Doctor, User
+from . import availability, directory, fragments, search, timeslots
+from .models import Appointment, DoctorAvailability, SlotHold, TimeSlot
+
+
+def invalidate_slots_on_commit(doctor_id):
+    # After commit, so a concurrent lookup cannot cache the old rows under
+    # the new version, and a rolled-back change invalidates nothing
+    transaction.on_commit(lambda: availability.invalidate_doctor(doctor_id))
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=SlotHold)
+@receiver(post_delete, sender=SlotHold)
+def invalidate_slots_on_change(sender, instance, **kwargs):
+    invalidate_slots_on_commit(instance.doctor_id)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def bump_fragment_versions(sender, instance, **kwargs):
+    # After commit, so a concurrent render cannot cache the old rows under
+    # the new version
+    doctor_id, patient_id = instance.doctor_id, instance.patient_id
+
+    def bump():
+        fragments.bump('doctor', doctor_id)
+        fragments.bump('patient', patient_id)
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=DoctorAvailability)
+@receiver(post_delete, sender=DoctorAvailability)
+def invalidate_on_availability_change(sender, instance, **kwargs):
+    invalidate_slots_on_commit(instance.doctor_id)
+
+
+@receiver(post_save, sender=Doctor)
+def invalidate_on_doctor_change(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_slots_on_commit(instance.pk)
+
+    # After commit, so a concurrent request cannot cache the old rows under
+    # the new version
+    def refresh():
+        directory.invalidate()
+        search.index_doctor(instance)
+    transaction.on_commit(refresh)
+
+
+@receiver(post_delete, sender=Doctor)
+def refresh_listings_on_doctor_delete(sender, instance, **kwargs):
+    doctor_id = instance.pk
+
+    def refresh():
+        directory.invalidate()
+        search.remove_doctor(doctor_id)
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=User)
+def refresh_listings_on_user_change(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which the directory doesn't show
+    if instance.user_type != 'doctor' or update_fields == frozenset(['last_login']):
+        return
+
+    def refresh():
+        directory.invalidate()
+        doctor = Doctor.objects.filter(user=instance).select_related('user').first()
+        if doctor is not None:
+            search.index_doctor(doctor)
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def refresh_time_slots(sender, instance, **kwargs):
+    timeslots.invalidate()
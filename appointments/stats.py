@@ -0,0 +1,173 @@
+"""
+Denormalised dashboard counters.
+
+``DoctorStats`` and ``PatientStats`` hold per-status appointment counts (and,
+for doctors, the number of distinct patients) so the dashboards read them in
+O(1) instead of scanning ``Appointment``. The booking services call
+``record_transition`` after every status change; anything that edits
+appointments behind their back (the admin, raw SQL) is repaired by the
+``rebuild_stats`` command, and ``check_stats`` reports drift.
+"""
+from collections import Counter
+
+from django.db import router
+from django.db.models import Count, F, Q
+
+from .models import Appointment, DoctorStats, PatientStats
+
+
+STATUS_FIELDS = {
+    'pending': 'pending_count',
+    'confirmed': 'confirmed_count',
+    'completed': 'completed_count',
+    'cancelled': 'cancelled_count',
+    'no_show': 'no_show_count',
+}
+
+# Appointments in these states count towards a doctor's patients
+COUNTED_STATUSES = ('pending', 'confirmed', 'completed')
+
+
+def _counted_appointments(doctor_id, patient_id):
+    return Appointment.objects.filter(
+        doctor_id=doctor_id,
+        patient_id=patient_id,
+        status__in=COUNTED_STATUSES
+    )
+
+
+def record_transition(appointment, old_status, old_patient_id=None):
+    """
+    Update the counters after ``appointment`` has been saved with a new status
+    (and, for rebookings, a new patient).
+
+    ``old_status`` is ``''`` for a newly created appointment and
+    ``old_patient_id`` defaults to the appointment's current patient. Call it
+    inside the transaction that saved the appointment.
+    """
+    if old_patient_id is None:
+        old_patient_id = appointment.patient_id
+    doctor_id = appointment.doctor_id
+    patient_id = appointment.patient_id
+    new_status = appointment.status
+    if old_status == new_status and old_patient_id == patient_id:
+        return
+
+    doctor_deltas = Counter()
+    old_patient_deltas = Counter()
+    new_patient_deltas = Counter()
+    if old_status:
+        doctor_deltas[STATUS_FIELDS[old_status]] -= 1
+        old_patient_deltas[STATUS_FIELDS[old_status]] -= 1
+    doctor_deltas[STATUS_FIELDS[new_status]] += 1
+    new_patient_deltas[STATUS_FIELDS[new_status]] += 1
+
+    # A patient is counted while they have at least one counted appointment
+    # with the doctor, so only the first one in and the last one out matter
+    patient_changed = old_patient_id != patient_id
+    was_counted = old_status in COUNTED_STATUSES
+    is_counted = new_status in COUNTED_STATUSES
+    if (was_counted or is_counted) and (patient_changed or was_counted != is_counted):
+        # Serialise the checks below per doctor: under READ COMMITTED two
+        # first bookings of one patient would each see only their own row
+        # and both count the patient
+        list(DoctorStats.objects.select_for_update().filter(pk=doctor_id).values_list('pk'))
+    if was_counted and (patient_changed or not is_counted):
+        if not _counted_appointments(doctor_id, old_patient_id).exists():
+            doctor_deltas['total_patients'] -= 1
+    if is_counted and (patient_changed or not was_counted):
+        if _counted_appointments(doctor_id, patient_id).count() == 1:
+            doctor_deltas['total_patients'] += 1
+
+    _apply(DoctorStats, doctor_id, doctor_deltas)
+    if patient_changed:
+        _apply(PatientStats, old_patient_id, old_patient_deltas)
+        _apply(PatientStats, patient_id, new_patient_deltas)
+    else:
+        # Counter.update keeps negative deltas, unlike ``+``
+        new_patient_deltas.update(old_patient_deltas)
+        _apply(PatientStats, patient_id, new_patient_deltas)
+
+
+def _apply(model, pk, deltas):
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    if not model.objects.filter(pk=pk).update(**changes):
+        # No row yet: a recount already reflects the change being recorded
+        rebuild(model, pk)
+
+
+def _counter_aggregates(model):
+    aggregates = {
+        field: Count('id', filter=Q(status=status))
+        for status, field in STATUS_FIELDS.items()
+    }
+    if model is DoctorStats:
+        aggregates['total_patients'] = Count('patient', filter=Q(status__in=COUNTED_STATUSES), distinct=True)
+    return aggregates
+
+
+def recount(model, pk=None):
+    """
+    Count the counters of ``DoctorStats`` or ``PatientStats`` from scratch,
+    for one doctor/patient or, with ``pk=None``, for all of them. Returns a
+    ``{pk: {field: value}}`` dict.
+    """
+    owner = 'doctor' if model is DoctorStats else 'patient'
+    # The counts are written back, so read them where they will be written,
+    # not from a replica that may lag behind
+    appointments = Appointment.objects.using(router.db_for_write(model)).order_by()
+    if pk is not None:
+        appointments = appointments.filter(**{owner: pk})
+    rows = appointments.values(owner).annotate(**_counter_aggregates(model))
+    return {row.pop(owner): row for row in rows}
+
+
+def rebuild(model, pk=None):
+    """
+    Overwrite stored counters with a full recount and return how many rows
+    were written. Owners without appointments get zeroed rows only when
+    rebuilding a single ``pk``.
+    """
+    counts = recount(model, pk)
+    if pk is not None and pk not in counts:
+        counts[pk] = {}
+    owner = 'doctor_id' if model is DoctorStats else 'patient_id'
+    defaults = {field: 0 for field in _counter_aggregates(model)}
+    for owner_id, values in counts.items():
+        model.objects.update_or_create(**{owner: owner_id}, defaults={**defaults, **values})
+    if pk is None:
+        model.objects.exclude(pk__in=counts.keys()).update(**defaults)
+    return len(counts)
+
+
+def check(model):
+    """
+    Compare stored counters with a full recount. Returns a list of
+    ``(pk, field, stored, actual)`` mismatches.
+    """
+    actual = recount(model)
+    fields = list(_counter_aggregates(model))
+    stored = {
+        row['pk']: row
+        for row in model.objects.values('pk', *fields)
+    }
+    mismatches = []
+    for pk in sorted(set(actual) | set(stored)):
+        for field in fields:
+            expected = actual.get(pk, {}).get(field, 0)
+            value = stored.get(pk, {}).get(field, 0)
+            if expected != value:
+                mismatches.append((pk, field, value, expected))
+    return mismatches
+
+
+def get_stats(model, pk):
+    """Return the counters row of a doctor/patient, building it if missing."""
+    stats = model.objects.filter(pk=pk).first()
+    if stats is None:
+        rebuild(model, pk)
+        # The row was just written to the primary; a replica may not have it yet
+        stats = model.objects.using(router.db_for_write(model)).get(pk=pk)
+    return stats
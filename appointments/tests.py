@@ -0,0 +1,1411 @@
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import warnings
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, IntegrityError, connection, connections, router, transaction
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+
+from accounts.models import User, Doctor, Patient
+from medibook import routers
+from .models import Appointment, AppointmentHistory, DoctorAvailability, DoctorStats, PatientStats, SlotHold, TimeSlot
+from . import async_views, availability, directory, exports, finder, fragments, importer, search, services, stats, timeslots, views
+from .services import book_slot, hold_slot, sweep_expired_holds, SlotUnavailable
+
+
+def next_weekday(weekday):
+    """Return the next date (after today) falling on ``weekday``."""
+    day = date.today() + timedelta(days=1)
+    while day.weekday() != weekday:
+        day += timedelta(days=1)
+    return day
+
+
+class MediBookTestCase(TestCase):
+    """Shared fixtures: all time slots, one doctor and one patient."""
+
+    # Under DATABASE_PROFILE=sqlite-replica nothing copies the fixtures to
+    # the replica, so only the tests that say so route reads to it
+    replica_reads = False
+
+    @classmethod
+    def setUpTestData(cls):
+        for value, label in TimeSlot.TIME_CHOICES:
+            TimeSlot.objects.create(time=value)
+        cls.doctor = cls.create_doctor('dr_test', 'MEDTEST1')
+        cls.patient = cls.create_patient('patient_test')
+
+    @classmethod
+    def create_doctor(cls, username, license_number, specialization='cardiology'):
+        # Run the on-commit listing and search refreshes, as a real commit would
+        with cls.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user(
+                username=username,
+                password='doctor123',
+                first_name='Test',
+                last_name='Doctor',
+                user_type='doctor'
+            )
+            doctor = Doctor.objects.create(
+                user=user,
+                specialization=specialization,
+                license_number=license_number,
+                experience_years=5,
+                consultation_fee=500
+            )
+        for weekday in range(5):
+            DoctorAvailability.objects.create(
+                doctor=doctor,
+                weekday=weekday,
+                start_time=time(9, 0),
+                end_time=time(12, 0)
+            )
+        return doctor
+
+    @classmethod
+    def create_patient(cls, username):
+        user = User.objects.create_user(
+            username=username,
+            password='patient123',
+            first_name='Test',
+            last_name='Patient',
+            user_type='patient'
+        )
+        return Patient.objects.create(user=user, gender='F')
+
+    def setUp(self):
+        cache.clear()
+        # Load the time slot registry up front, as a running worker would
+        timeslots.invalidate()
+        timeslots.get_registry()
+        if not self.replica_reads:
+            patcher = mock.patch.object(routers, 'replica_configured', return_value=False)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def slot(self, value):
+        return TimeSlot.objects.get(time=value)
+
+
+class DoctorSlotsTests(MediBookTestCase):
+
+    def slots_url(self, day, doctor=None):
+        doctor = doctor or self.doctor
+        return reverse('appointments:doctor_slots', args=[doctor.id]) + f'?date={day.isoformat()}'
+
+    def test_window_mask(self):
+        mask = availability.window_mask(time(9, 0), time(10, 0))
+        self.assertEqual(availability.mask_to_indexes(mask), [0, 1])
+        self.assertEqual(availability.window_mask(time(8, 0), time(23, 0)), availability.FULL_MASK)
+        self.assertEqual(availability.window_mask(time(13, 0), time(13, 30)), 0)
+
+    def test_week_matrix_operations(self):
+        week = availability.week_matrix([(0, time(9, 0), time(10, 0)), (2, time(11, 0), time(12, 0))])
+        self.assertEqual(week, (0b11, 0, 0b110000, 0, 0, 0, 0))
+        self.assertEqual(availability.week_matrices([self.doctor.id])[self.doctor.id], (0b111111,) * 5 + (0, 0))
+        self.assertEqual(availability.free_count(week), 4)
+        self.assertEqual(availability.intersect(week, (0b10,) * 7), [0b10, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(availability.next_free(week), (0, 0))
+        self.assertEqual(availability.next_free(week, after=(0, 1)), (2, 4))
+        self.assertIsNone(availability.next_free(week, after=(2, 5)))
+
+    def test_free_slots_follow_availability_window(self):
+        response = self.client.get(self.slots_url(next_weekday(0)))
+        self.assertEqual(response.status_code, 200)
+        times = [slot['time'] for slot in response.json()['slots']]
+        self.assertEqual(times, ['09:00', '09:30', '10:00', '10:30', '11:00', '11:30'])
+
+    def test_no_slots_outside_working_days(self):
+        response = self.client.get(self.slots_url(next_weekday(6)))
+        self.assertEqual(response.json()['slots'], [])
+
+    def free_times(self, day):
+        return [slot['time'] for slot in self.client.get(self.slots_url(day)).json()['slots']]
+
+    def test_booking_and_cancelling_invalidate_cached_bitmap(self):
+        day = next_weekday(1)
+        self.free_times(day)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                patient=self.patient,
+                doctor=self.doctor,
+                appointment_date=day,
+                appointment_time=self.slot('10:00')
+            )
+        self.assertNotIn('10:00', self.free_times(day))
+        with self.assertNumQueries(0):
+            self.free_times(day)
+
+        appointment.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertIn('10:00', self.free_times(day))
+
+    def test_rolled_back_booking_keeps_cached_bitmap(self):
+        day = next_weekday(1)
+        self.free_times(day)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Appointment.objects.create(
+                        patient=self.patient,
+                        doctor=self.doctor,
+                        appointment_date=day,
+                        appointment_time=self.slot('10:00')
+                    )
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(0):
+            self.assertIn('10:00', self.free_times(day))
+
+    def test_entry_built_before_a_commit_is_not_served_after_it(self):
+        day = next_weekday(1)
+        build_range = availability.build_range
+
+        def build_then_book(*args):
+            built = build_range(*args)
+            # Another request books and commits before this one caches its entry
+            with self.captureOnCommitCallbacks(execute=True):
+                Appointment.objects.create(
+                    patient=self.patient,
+                    doctor=self.doctor,
+                    appointment_date=day,
+                    appointment_time=self.slot('10:00')
+                )
+            return built
+
+        with mock.patch.object(availability, 'build_range', build_then_book):
+            self.assertIn('10:00', self.free_times(day))
+        self.assertNotIn('10:00', self.free_times(day))
+
+    def test_availability_change_invalidates_cache(self):
+        day = next_weekday(2)
+        self.client.get(self.slots_url(day))
+        DoctorAvailability.objects.filter(doctor=self.doctor, weekday=2).update(is_available=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            DoctorAvailability.objects.get(doctor=self.doctor, weekday=2).save()
+        self.assertEqual(self.client.get(self.slots_url(day)).json()['slots'], [])
+
+    def test_started_slots_are_not_free_today(self):
+        day = next_weekday(0)
+        now = timezone.make_aware(datetime.combine(day, time(10, 15)))
+        range_url = reverse('appointments:doctor_slots_range', args=[self.doctor.id])
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            self.assertEqual(self.free_times(day), ['10:30', '11:00', '11:30'])
+            data = self.client.get(range_url, {'start': day.isoformat(), 'end': day.isoformat()}).json()
+            self.assertEqual(data['next_free']['time'], '10:30')
+            self.assertEqual(data['matrix'][0][:6], [0, 0, 0, 1, 1, 1])
+
+    def test_invalid_and_past_dates_rejected(self):
+        url = reverse('appointments:doctor_slots', args=[self.doctor.id])
+        self.assertEqual(self.client.get(url + '?date=tomorrow').status_code, 400)
+        yesterday = date.today() - timedelta(days=2)
+        self.assertEqual(self.client.get(self.slots_url(yesterday)).status_code, 400)
+
+    def test_unknown_doctor(self):
+        url = reverse('appointments:doctor_slots', args=[999999])
+        self.assertEqual(self.client.get(url + f'?date={next_weekday(0).isoformat()}').status_code, 404)
+
+
+class DoctorSlotsRangeTests(MediBookTestCase):
+
+    def range_url(self, start, end):
+        url = reverse('appointments:doctor_slots_range', args=[self.doctor.id])
+        return url + f'?start={start.isoformat()}&end={end.isoformat()}'
+
+    def test_week_matrix(self):
+        monday = next_weekday(0)
+        Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=monday,
+            appointment_time=self.slot('09:30')
+        )
+        data = self.client.get(self.range_url(monday, monday + timedelta(days=6))).json()
+        self.assertEqual(len(data['dates']), 7)
+        self.assertEqual(len(data['matrix']), 7)
+        self.assertEqual(len(data['matrix'][0]), availability.SLOT_COUNT)
+        self.assertEqual(data['matrix'][0][:7], [1, 0, 1, 1, 1, 1, 0])
+        self.assertEqual(data['matrix'][1][:7], [1, 1, 1, 1, 1, 1, 0])
+        self.assertEqual(data['bitmaps'][6], 0)
+        self.assertEqual(data['free_count'], 29)
+        self.assertEqual(data['next_free'], {'date': monday.isoformat(), 'id': self.slot('09:00').id, 'time': '09:00'})
+
+    def test_range_query_count(self):
+        start = next_weekday(0)
+        with self.assertNumQueries(4):
+            self.client.get(self.range_url(start, start + timedelta(days=59)))
+        with self.assertNumQueries(0):
+            self.client.get(self.range_url(start, start + timedelta(days=59)))
+
+    def test_range_limits(self):
+        start = next_weekday(0)
+        self.assertEqual(self.client.get(self.range_url(start, start + timedelta(days=60))).status_code, 400)
+        self.assertEqual(self.client.get(self.range_url(start, start - timedelta(days=1))).status_code, 400)
+
+
+class BookingServiceTests(MediBookTestCase):
+
+    def book(self, patient, day, value='10:00'):
+        return book_slot(
+            patient=patient,
+            doctor=self.doctor,
+            appointment_date=day,
+            appointment_time=self.slot(value),
+            symptoms='Headache',
+            changed_by=patient.user
+        )
+
+    def test_new_booking_logs_history(self):
+        appointment, rebooked = self.book(self.patient, next_weekday(0))
+        self.assertFalse(rebooked)
+        self.assertEqual(appointment.status, 'pending')
+        history = AppointmentHistory.objects.get(appointment=appointment)
+        self.assertEqual((history.old_status, history.new_status), ('', 'pending'))
+
+    def test_taken_slot_raises(self):
+        day = next_weekday(0)
+        self.book(self.patient, day)
+        other = self.create_patient('patient_other')
+        with self.assertRaises(SlotUnavailable):
+            self.book(other, day)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_cancelled_slot_is_rebooked(self):
+        day = next_weekday(0)
+        appointment, _ = self.book(self.patient, day)
+        appointment.status = 'cancelled'
+        appointment.save()
+
+        other = self.create_patient('patient_other')
+        rebooked_appointment, rebooked = self.book(other, day)
+        self.assertTrue(rebooked)
+        self.assertEqual(rebooked_appointment.pk, appointment.pk)
+        self.assertEqual(rebooked_appointment.patient, other)
+        history = AppointmentHistory.objects.filter(appointment=appointment).first()
+        self.assertEqual((history.old_status, history.new_status), ('cancelled', 'pending'))
+
+
+class AppointmentTimeTests(MediBookTestCase):
+
+    def create(self, day, value):
+        return Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=day,
+            appointment_time=self.slot(value)
+        )
+
+    def test_start_minute_follows_slot(self):
+        appointment = self.create(next_weekday(0), '14:30')
+        self.assertEqual(appointment.start_minute, 14 * 60 + 30)
+        appointment.appointment_time = self.slot('09:00')
+        appointment.save()
+        self.assertEqual(Appointment.objects.get(pk=appointment.pk).start_minute, 9 * 60)
+
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.appointment_time_id = self.slot('17:00').id
+        appointment.save()
+        self.assertEqual(Appointment.objects.get(pk=appointment.pk).start_minute, 17 * 60)
+
+    def test_is_past_and_can_cancel_without_queries(self):
+        now = timezone.make_aware(datetime.combine(date.today(), time(10, 15)))
+        today = now.date()
+        for value, day in [('10:00', today), ('10:30', today), ('18:00', today - timedelta(days=1))]:
+            self.create(day, value)
+        self.create(today + timedelta(days=1), '09:00')
+
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            appointments = list(Appointment.objects.order_by('appointment_date', 'start_minute'))
+            with self.assertNumQueries(0):
+                self.assertEqual([appointment.is_past for appointment in appointments], [True, True, False, False])
+                self.assertEqual([appointment.can_cancel for appointment in appointments], [False, False, True, True])
+
+
+class TimeSlotRegistryTests(MediBookTestCase):
+
+    def test_lookups_without_queries(self):
+        slot = self.slot('10:30')
+        with self.assertNumQueries(0):
+            self.assertEqual([s.time for s in timeslots.all_slots()], list(availability.SLOT_TIMES))
+            self.assertEqual(timeslots.get_slot(slot.id), slot)
+            self.assertEqual(timeslots.get_slot(str(slot.id)), slot)
+            self.assertEqual(timeslots.get_slot_by_time('10:30'), slot)
+            self.assertIsNone(timeslots.get_slot('abc'))
+            self.assertIsNone(timeslots.get_slot(999999))
+
+    def test_refreshed_on_save_and_delete(self):
+        slot = self.slot('18:00')
+        slot.delete()
+        self.assertIsNone(timeslots.get_slot_by_time('18:00'))
+        TimeSlot.objects.create(time='18:00')
+        self.assertIsNotNone(timeslots.get_slot_by_time('18:00'))
+
+    def test_empty_table_is_not_kept(self):
+        TimeSlot.objects.all().delete()
+        self.assertEqual(timeslots.all_slots(), ())
+        # Populated by another process, so no signal drops the registry
+        TimeSlot.objects.bulk_create([TimeSlot(time=value) for value in availability.SLOT_TIMES])
+        self.assertIsNotNone(timeslots.get_slot_by_time('09:00'))
+
+    def test_appointment_slot_from_registry(self):
+        Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=next_weekday(0),
+            appointment_time=self.slot('11:00')
+        )
+        appointment = Appointment.objects.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(appointment.slot.get_time_display(), '11:00 AM')
+
+
+class BookAppointmentViewTests(MediBookTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.patient.user)
+        self.url = reverse('appointments:book_appointment', args=[self.doctor.id])
+
+    def post(self, day, value='10:00'):
+        return self.client.post(self.url, {
+            'appointment_date': day.isoformat(),
+            'appointment_time': self.slot(value).id,
+        }, follow=True)
+
+    def test_double_booking_reports_taken_slot(self):
+        day = next_weekday(0)
+        self.post(day)
+        response = self.post(day)
+        self.assertContains(response, 'This time slot is already booked.')
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_slots_outside_availability_are_refused(self):
+        response = self.post(next_weekday(6), '18:00')
+        self.assertContains(response, 'The doctor is not available at this time.')
+        response = self.client.post(reverse('appointments:hold_appointment_slot', args=[self.doctor.id]), {
+            'appointment_date': next_weekday(6).isoformat(),
+            'appointment_time': self.slot('18:00').id,
+        })
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_invalid_time_slot(self):
+        response = self.client.post(self.url, {
+            'appointment_date': next_weekday(0).isoformat(),
+            'appointment_time': 'abc',
+        }, follow=True)
+        self.assertContains(response, 'Invalid time slot selected.')
+
+    def test_form_reads_slots_from_registry(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['time_slots']), availability.SLOT_COUNT)
+        self.assertFalse([query for query in context.captured_queries if 'appointments_timeslot' in query['sql']])
+
+
+class SlotHoldTests(MediBookTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.day = next_weekday(0)
+        self.other = self.create_patient('patient_other')
+
+    def hold(self, patient, value='10:00'):
+        return hold_slot(patient, self.doctor, self.day, self.slot(value))
+
+    def free_times(self, user=None):
+        if user:
+            self.client.force_login(user)
+        url = reverse('appointments:doctor_slots', args=[self.doctor.id]) + f'?date={self.day.isoformat()}'
+        return [slot['time'] for slot in self.client.get(url).json()['slots']]
+
+    def test_held_slot_hidden_from_others_only(self):
+        self.free_times()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hold(self.patient)
+        self.assertNotIn('10:00', self.free_times())
+        self.assertIn('10:00', self.free_times(self.patient.user))
+
+    def test_closed_slots_cannot_be_held_or_booked(self):
+        with self.assertRaises(services.SlotClosed):
+            self.hold(self.patient, '14:00')
+        self.doctor.is_available = False
+        self.doctor.save()
+        with self.assertRaises(services.SlotClosed):
+            self.hold(self.patient)
+        with self.assertRaises(services.SlotClosed):
+            book_slot(self.patient, self.doctor, self.day, self.slot('10:00'), '', self.patient.user)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_hold_blocks_other_patients(self):
+        self.hold(self.patient)
+        with self.assertRaises(SlotUnavailable):
+            self.hold(self.other)
+        with self.assertRaises(SlotUnavailable):
+            book_slot(self.other, self.doctor, self.day, self.slot('10:00'), '', self.other.user)
+
+    def test_new_hold_releases_previous_one(self):
+        self.hold(self.patient, '10:00')
+        self.hold(self.patient, '10:30')
+        self.assertEqual(SlotHold.objects.get(patient=self.patient).appointment_time.time, '10:30')
+
+    def test_booking_consumes_own_hold(self):
+        self.hold(self.patient)
+        book_slot(self.patient, self.doctor, self.day, self.slot('10:00'), '', self.patient.user)
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_expired_holds_are_ignored_and_swept(self):
+        hold = self.hold(self.patient)
+        SlotHold.objects.filter(pk=hold.pk).update(expires_at=hold.expires_at - timedelta(hours=1))
+        self.hold(self.other)
+        self.assertEqual(SlotHold.objects.get().patient, self.other)
+
+        SlotHold.objects.update(expires_at=hold.expires_at - timedelta(hours=1))
+        self.assertEqual(sweep_expired_holds(), 1)
+
+    def test_hold_endpoint(self):
+        self.client.force_login(self.other.user)
+        url = reverse('appointments:hold_appointment_slot', args=[self.doctor.id])
+        data = {'appointment_date': self.day.isoformat(), 'appointment_time': self.slot('10:00').id}
+        self.assertEqual(self.client.post(url, data).status_code, 200)
+        self.client.force_login(self.patient.user)
+        self.assertEqual(self.client.post(url, data).status_code, 409)
+
+
+class PatientDashboardTests(MediBookTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.patient.user)
+        self.url = reverse('appointments:patient_dashboard')
+
+    def add_appointments(self, days, start=1):
+        slots = list(TimeSlot.objects.all())
+        for offset in range(start, start + days):
+            for slot in slots[:3]:
+                Appointment.objects.create(
+                    patient=self.patient,
+                    doctor=self.doctor,
+                    appointment_date=date.today() + timedelta(days=offset),
+                    appointment_time=slot
+                )
+
+    def test_counters(self):
+        self.add_appointments(2, start=-2)
+        self.add_appointments(2, start=1)
+        Appointment.objects.filter(appointment_date__gt=date.today()).first().delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['upcoming_count'], 5)
+        self.assertEqual(response.context['past_count'], 6)
+        self.assertEqual(response.context['total_appointments'], 11)
+
+    def test_query_budget_is_fixed(self):
+        self.add_appointments(1, start=-1)
+        self.add_appointments(1, start=1)
+        stats.rebuild(PatientStats)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+        # One aggregate for the counters plus one query per list
+        appointment_queries = [
+            query for query in small.captured_queries
+            if 'FROM "appointments_appointment"' in query['sql']
+        ]
+        self.assertEqual(len(appointment_queries), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_appointments(10, start=-11)
+            self.add_appointments(10, start=2)
+        with self.assertNumQueries(len(small.captured_queries)):
+            self.client.get(self.url)
+
+
+class DoctorDashboardTests(MediBookTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.doctor.user)
+        self.url = reverse('appointments:doctor_dashboard')
+
+    def add_appointments(self, patient, days, start=0, status='pending'):
+        slots = list(TimeSlot.objects.all())
+        for offset in range(start, start + days):
+            for slot in slots[:2]:
+                Appointment.objects.get_or_create(
+                    doctor=self.doctor,
+                    appointment_date=date.today() + timedelta(days=offset),
+                    appointment_time=slot,
+                    defaults={'patient': patient, 'status': status}
+                )
+
+    def test_counters(self):
+        other = self.create_patient('patient_other')
+        self.add_appointments(self.patient, 1, start=0)
+        self.add_appointments(self.patient, 3, start=1)
+        self.add_appointments(other, 2, start=-3, status='completed')
+        self.add_appointments(other, 1, start=-5, status='cancelled')
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['today_count'], 2)
+        self.assertEqual(response.context['upcoming_count'], 6)
+        self.assertEqual(response.context['total_patients'], 2)
+
+    def test_query_budget_is_fixed(self):
+        self.add_appointments(self.patient, 2, start=0)
+        stats.rebuild(DoctorStats)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+        # One aggregate for the counters plus one query per list
+        appointment_queries = [
+            query for query in small.captured_queries
+            if 'FROM "appointments_appointment"' in query['sql']
+        ]
+        self.assertEqual(len(appointment_queries), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(5):
+                self.add_appointments(self.create_patient(f'patient_{index}'), 4, start=index * 4 - 10)
+        with self.assertNumQueries(len(small.captured_queries)):
+            self.client.get(self.url)
+
+
+class StatsTests(MediBookTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = self.create_patient('patient_other')
+
+    def book(self, patient, value, offset=1):
+        appointment, _ = book_slot(
+            patient, self.doctor, next_weekday(0) + timedelta(days=7 * offset),
+            self.slot(value), '', patient.user
+        )
+        return appointment
+
+    def assertConsistent(self):
+        self.assertEqual(stats.check(DoctorStats), [])
+        self.assertEqual(stats.check(PatientStats), [])
+
+    def test_counters_follow_booking_lifecycle(self):
+        first = self.book(self.patient, '09:00')
+        self.book(self.patient, '09:30')
+        self.book(self.other, '10:00')
+        doctor_stats = DoctorStats.objects.get(pk=self.doctor.pk)
+        self.assertEqual((doctor_stats.pending_count, doctor_stats.total_patients), (3, 2))
+
+        services.update_appointment_status(first, 'completed')
+        services.cancel_appointment(first, self.doctor.user)  # completed: not cancellable
+        other_appointment = Appointment.objects.get(patient=self.other)
+        services.cancel_appointment(other_appointment, self.other.user)
+        doctor_stats.refresh_from_db()
+        self.assertEqual(doctor_stats.total_patients, 1)
+        self.assertEqual(doctor_stats.cancelled_count, 1)
+        self.assertEqual(PatientStats.objects.get(pk=self.patient.pk).total_appointments, 2)
+        self.assertConsistent()
+
+    def test_rebooking_moves_counters_between_patients(self):
+        appointment = self.book(self.patient, '09:00')
+        services.cancel_appointment(appointment, self.patient.user)
+        self.book(self.other, '09:00')
+        self.assertEqual(PatientStats.objects.get(pk=self.patient.pk).cancelled_count, 0)
+        self.assertEqual(PatientStats.objects.get(pk=self.other.pk).pending_count, 1)
+        self.assertEqual(DoctorStats.objects.get(pk=self.doctor.pk).total_patients, 1)
+        self.assertConsistent()
+
+    def test_distinct_patient_check_locks_the_doctor_row(self):
+        from django.db.models import QuerySet
+
+        select_for_update = QuerySet.select_for_update
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=select_for_update) as lock:
+            self.book(self.patient, '09:00')
+        self.assertIn(DoctorStats, [call.args[0].model for call in lock.call_args_list])
+
+    def test_admin_is_read_only(self):
+        from django.contrib import admin
+
+        request = RequestFactory().get('/admin/')
+        request.user = User.objects.create_superuser('admin_test', password='admin123')
+        for model in (DoctorStats, PatientStats):
+            model_admin = admin.site._registry[model]
+            self.assertFalse(model_admin.has_add_permission(request))
+            self.assertFalse(model_admin.has_change_permission(request))
+            self.assertFalse(model_admin.has_delete_permission(request))
+            self.assertTrue(model_admin.has_view_permission(request))
+
+    def test_check_and_rebuild_commands(self):
+        self.book(self.patient, '09:00')
+        DoctorStats.objects.update(pending_count=7)
+        with self.assertRaises(CommandError):
+            call_command('check_stats', stdout=StringIO())
+        call_command('rebuild_stats', stdout=StringIO())
+        call_command('check_stats', stdout=StringIO())
+        self.assertEqual(DoctorStats.objects.get().pending_count, 1)
+
+
+class DoctorDirectoryTests(MediBookTestCase):
+
+    url = reverse_lazy('appointments:doctor_list')
+
+    def test_facets_and_filter(self):
+        self.create_doctor('dr_skin', 'MEDTEST2', specialization='dermatology')
+        response = self.client.get(self.url, {'specialization': 'dermatology'})
+        self.assertEqual([doctor.user.username for doctor in response.context['doctors']], ['dr_skin'])
+        facets = {value: count for value, label, count in response.context['specializations']}
+        self.assertEqual((facets['cardiology'], facets['dermatology'], facets['neurology']), (1, 1, 0))
+
+    def test_anonymous_views_served_from_cache(self):
+        self.client.get(self.url)
+        self.client.get(self.url, {'specialization': 'cardiology'})
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+            self.client.get(self.url, {'specialization': 'cardiology'})
+            self.client.get(self.url, {'specialization': 'unknown'})
+
+    def test_evicted_version_is_not_reused(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.is_available = False
+            self.doctor.save()
+        cache.delete(directory.VERSION_KEY)
+        self.assertEqual(list(self.client.get(self.url).context['doctors']), [])
+
+    def test_doctor_changes_invalidate_cache(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.is_available = False
+            self.doctor.save()
+        self.assertEqual(list(self.client.get(self.url).context['doctors']), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.is_available = True
+            self.doctor.save()
+            self.doctor.user.first_name = 'Renamed'
+            self.doctor.user.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Renamed')
+
+
+@override_settings(DOCTOR_LIST_PAGE_SIZE=2)
+class DoctorPaginationTests(MediBookTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(4):
+            cls.create_doctor(f'dr_page{index}', f'MEDPAGE{index}')
+
+    def get(self, **params):
+        return self.client.get(reverse('appointments:doctor_list_json'), params).json()
+
+    def test_walks_forward_and_back(self):
+        first = self.get()
+        self.assertEqual(len(first['doctors']), 2)
+        self.assertIsNone(first['previous'])
+
+        second = self.get(after=first['next'])
+        third = self.get(after=second['next'])
+        self.assertEqual(len(third['doctors']), 1)
+        self.assertIsNone(third['next'])
+        ids = [doctor['id'] for page in (first, second, third) for doctor in page['doctors']]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), 5)
+
+        back = self.get(before=third['previous'])
+        self.assertEqual(back['doctors'], second['doctors'])
+        self.assertEqual(self.get(before=back['previous'])['doctors'], first['doctors'])
+
+    def test_page_size_parameter(self):
+        self.assertEqual(len(self.get(page_size=10)['doctors']), 5)
+        self.assertEqual(len(self.get(page_size='junk')['doctors']), 2)
+
+    def test_html_page_links(self):
+        response = self.client.get(reverse('appointments:doctor_list'))
+        self.assertEqual(len(response.context['doctors']), 2)
+        self.assertContains(response, f"after={response.context['page'].next_cursor}")
+
+
+class DoctorSearchTests(MediBookTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.skin = cls.create_doctor('dr_skin', 'MEDTEST2', specialization='dermatology')
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.skin.user.first_name = 'Priya'
+            cls.skin.user.save()
+            cls.skin.bio = 'Treats cardiac patients with skin conditions.'
+            cls.skin.save()
+
+    def names(self, query, **kwargs):
+        return [doctor.user.username for doctor in search.search(query, **kwargs)]
+
+    def test_prefix_matching_and_ranking(self):
+        self.assertEqual(self.names('pri'), ['dr_skin'])
+        self.assertEqual(self.names('derm'), ['dr_skin'])
+        # The specialization label outranks a mention in another doctor's bio
+        self.assertEqual(self.names('cardi'), ['dr_test', 'dr_skin'])
+        self.assertEqual(self.names('cardi', specialization='dermatology'), ['dr_skin'])
+        self.assertEqual(self.names('"*'), [])
+
+    def test_index_follows_doctor_and_user_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.skin.user.last_name = 'Zephyr'
+            self.skin.user.save()
+        self.assertEqual(self.names('zeph'), ['dr_skin'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.skin.is_available = False
+            self.skin.save()
+        self.assertEqual(self.names('zeph'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.skin.delete()
+        self.assertEqual(search.search_ids('zeph', 10), [])
+
+    def test_index_waits_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.skin.user.last_name = 'Zephyr'
+            self.skin.user.save()
+            self.assertEqual(self.names('zeph'), [])
+        self.assertEqual(len(callbacks), 1)
+
+    def test_filters_apply_before_the_limit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(30):
+                doctor = self.create_doctor(f'dr_carl{number}', f'MEDCARL{number}')
+                doctor.user.first_name = 'Carl'
+                doctor.user.save()
+            carlos = self.create_doctor('dr_carlos', 'MEDCARLOS', specialization='neurology')
+            carlos.user.first_name = 'Carlos'
+            carlos.user.save()
+        self.assertEqual(self.names('carl', specialization='neurology', limit=5), ['dr_carlos'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            carlos.is_available = False
+            carlos.save()
+        Doctor.objects.filter(user__username='dr_carl0').update(is_available=False)
+        self.assertEqual(self.names('carl', specialization='neurology', limit=5), [])
+        self.assertEqual(len(self.names('carl', limit=100)), 29)
+
+    def test_doctor_list_search(self):
+        response = self.client.get(reverse('appointments:doctor_list'), {'q': 'priya'})
+        self.assertEqual([doctor.user.username for doctor in response.context['doctors']], ['dr_skin'])
+
+
+class SoonestAvailableTests(MediBookTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.second = cls.create_doctor('dr_second', 'MEDTEST2')
+        cls.skin = cls.create_doctor('dr_skin', 'MEDTEST3', specialization='dermatology')
+
+    def setUp(self):
+        super().setUp()
+        self.day = next_weekday(0)
+
+    def book(self, doctor, value, day=None):
+        book_slot(self.patient, doctor, day or self.day, self.slot(value), '', self.patient.user)
+
+    def ranking(self, specialization='cardiology', limit=10, user_id=None):
+        openings = finder.soonest_available(specialization, self.day, self.day + timedelta(days=6), limit, user_id)
+        return [(doctor.user.username, day, availability.SLOT_TIMES[index]) for doctor, day, index, slot_id in openings]
+
+    def test_ranks_doctors_by_earliest_free_slot(self):
+        self.book(self.doctor, '09:00')
+        self.book(self.doctor, '09:30')
+        self.assertEqual(self.ranking(), [
+            ('dr_second', self.day, '09:00'),
+            ('dr_test', self.day, '10:00'),
+        ])
+        self.assertEqual(self.ranking(limit=1), [('dr_second', self.day, '09:00')])
+        self.assertEqual([name for name, day, value in self.ranking(specialization=None)], ['dr_second', 'dr_skin', 'dr_test'])
+
+    def test_fully_booked_days_roll_over(self):
+        for value in ('09:00', '09:30', '10:00', '10:30', '11:00', '11:30'):
+            self.book(self.second, value)
+        self.assertEqual(self.ranking()[1], ('dr_second', self.day + timedelta(days=1), '09:00'))
+
+    def test_holds_count_as_taken_except_for_holder(self):
+        other = self.create_patient('patient_other')
+        hold_slot(other, self.second, self.day, self.slot('09:00'))
+        self.assertIn(('dr_second', self.day, '09:30'), self.ranking())
+        self.assertIn(('dr_second', self.day, '09:00'), self.ranking(user_id=other.user_id))
+
+    def test_query_count_does_not_grow_with_doctors(self):
+        with self.assertNumQueries(4):
+            self.ranking(specialization=None)
+        for number in range(5):
+            self.create_doctor(f'dr_extra{number}', f'MEDEXTRA{number}')
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.ranking(specialization=None)), 8)
+
+    def test_endpoint(self):
+        url = reverse('appointments:soonest_available')
+        response = self.client.get(url, {'specialization': 'dermatology', 'start': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        doctors = response.json()['doctors']
+        self.assertEqual([doctor['id'] for doctor in doctors], [self.skin.id])
+        self.assertEqual(doctors[0]['date'], self.day.isoformat())
+        self.assertEqual(doctors[0]['slot']['time'], '09:00')
+        self.assertEqual(self.client.get(url, {'start': '2000-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'soon'}).status_code, 400)
+
+        today = timezone.localdate()
+        data = self.client.get(url).json()
+        self.assertEqual((data['start'], data['end']), (today.isoformat(), (today + timedelta(days=6)).isoformat()))
+        too_long = self.day + timedelta(days=availability.MAX_RANGE_DAYS)
+        self.assertEqual(self.client.get(url, {'start': self.day.isoformat(), 'end': too_long.isoformat()}).status_code, 400)
+        before = self.day - timedelta(days=1)
+        self.assertEqual(self.client.get(url, {'start': self.day.isoformat(), 'end': before.isoformat()}).status_code, 400)
+
+    def test_default_window_starts_on_the_local_date(self):
+        # 01:30 in Asia/Kolkata is still the previous day in UTC
+        now = timezone.make_aware(datetime(2026, 10, 21, 1, 30)).astimezone(dt_timezone.utc)
+        url = reverse('appointments:soonest_available')
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            data = self.client.get(url).json()
+            self.assertEqual(data['start'], '2026-10-21')
+            self.assertEqual(self.client.get(url, {'start': '2026-10-20'}).status_code, 400)
+
+
+class ImportAppointmentsTests(MediBookTestCase):
+
+    def run_import(self, content, suffix, *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_appointments', f.name, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import(self):
+        day = next_weekday(0).isoformat()
+        Appointment.objects.create(
+            patient=self.patient,
+            doctor=self.doctor,
+            appointment_date=next_weekday(0),
+            appointment_time=self.slot('11:00')
+        )
+        out, err = self.run_import(
+            'doctor,patient,date,time,status,symptoms\n'
+            f'MEDTEST1,patient_test,{day},09:00,,Cough\n'
+            f'MEDTEST1,patient_test,{day},09:30,cancelled,\n'
+            f'MEDTEST1,patient_test,{day},09:00,,Duplicate in file\n'
+            f'MEDTEST1,patient_test,{day},11:00,,Already booked\n'
+            f'MEDTEST1,nobody,{day},10:00,,\n'
+            f'MEDTEST1,patient_test,{day},13:00,,\n',
+            '.csv', '--chunk-size', '2', '--batch-size', '1'
+        )
+        self.assertIn('Imported 2 appointments, skipped 4', out)
+        self.assertIn('Line 4: slot already booked', err)
+        self.assertIn('Line 5: slot already booked', err)
+        self.assertIn("Line 6: unknown patient username 'nobody'", err)
+        self.assertIn("Line 7: unknown time slot '13:00'", err)
+
+        imported = Appointment.objects.get(appointment_time=self.slot('09:00'))
+        self.assertEqual((imported.status, imported.symptoms, imported.start_minute), ('completed', 'Cough', 540))
+        self.assertEqual(imported.history.get().changed_by, self.patient.user)
+        self.assertEqual(stats.check(DoctorStats), [])
+        self.assertEqual(stats.check(PatientStats), [])
+
+    def test_jsonl_import(self):
+        day = next_weekday(1).isoformat()
+        lines = [
+            json.dumps({'doctor': 'MEDTEST1', 'patient': 'patient_test', 'date': day, 'time': '10:00', 'status': 'pending'}),
+            'not json',
+            json.dumps({'doctor': 'MEDTEST1', 'patient': 'patient_test', 'date': '17/10/2026', 'time': '10:30'}),
+        ]
+        availability.get_day(self.doctor.id, next_weekday(1))
+        out, err = self.run_import('\n'.join(lines) + '\n', '.jsonl', '--changed-by', 'dr_test')
+        self.assertIn('Imported 1 appointments, skipped 2', out)
+        self.assertIn('Line 2: invalid JSON', err)
+        self.assertIn('Line 3: invalid date', err)
+        self.assertEqual(AppointmentHistory.objects.get().changed_by, self.doctor.user)
+        # Cached availability is dropped for the imported doctors
+        self.assertNotIn('10:00', [slot['time'] for slot in availability.free_slots(availability.get_day(self.doctor.id, next_weekday(1)))])
+
+    def test_failed_chunk_still_refreshes_earlier_chunks(self):
+        day = next_weekday(0)
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=day, appointment_time=self.slot('11:00')
+        )
+        content = (
+            'doctor,patient,date,time\n'
+            f'MEDTEST1,patient_test,{day},09:00\n'
+            f'MEDTEST1,patient_test,{day},11:00\n'
+        )
+        # As if another writer booked 11:00 after the chunk was checked
+        with mock.patch.object(importer.Importer, '_taken', return_value=set()):
+            with self.assertRaises(IntegrityError):
+                self.run_import(content, '.csv', '--chunk-size', '1')
+        self.assertEqual(Appointment.objects.count(), 2)
+        self.assertEqual(stats.check(DoctorStats), [])
+        self.assertEqual(stats.check(PatientStats), [])
+
+    def test_existing_slots_looked_up_by_exact_day(self):
+        day = next_weekday(0)
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=day + timedelta(days=3),
+            appointment_time=self.slot('09:00')
+        )
+        rows = [
+            Appointment(doctor_id=self.doctor.id, appointment_date=day + timedelta(days=offset))
+            for offset in (0, 7)
+        ]
+        load = importer.Importer()
+        with self.assertNumQueries(1):
+            self.assertEqual(load._taken(rows), set())
+
+    def test_bad_arguments(self):
+        with self.assertRaises(CommandError):
+            call_command('import_appointments', 'appointments.txt')
+        with self.assertRaises(CommandError):
+            call_command('import_appointments', '/nonexistent/appointments.csv')
+
+
+class GenerateLoadDataTests(TestCase):
+
+    def generate(self, prefix, seed=7):
+        call_command(
+            'generate_load_data', '--doctors', '3', '--patients', '5', '--days', '14',
+            '--seed', str(seed), '--prefix', prefix, '--batch-size', '4', stdout=StringIO()
+        )
+        doctors = Doctor.objects.filter(user__username__startswith=f'{prefix}_')
+        return (
+            list(doctors.order_by('id').values_list('user__first_name', 'specialization')),
+            list(Appointment.objects.filter(doctor__in=doctors).order_by('id').values_list(
+                'appointment_date', 'appointment_time__time', 'status'
+            )),
+        )
+
+    def test_generates_consistent_deterministic_data(self):
+        first = self.generate('one')
+        self.assertEqual(len(first[0]), 3)
+        self.assertTrue(first[1])
+        self.assertEqual(Patient.objects.count(), 5)
+        self.assertEqual(stats.check(DoctorStats), [])
+        self.assertEqual(stats.check(PatientStats), [])
+        self.assertEqual(self.generate('two'), first)
+        self.assertEqual(User.objects.get(username='one_patient0').password, User.objects.get(username='one_doctor2').password)
+
+        with self.assertRaises(CommandError):
+            self.generate('one')
+
+
+class ExportAppointmentsTests(MediBookTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_doctor = self.create_doctor('dr_other', 'MEDTEST2')
+        self.day = next_weekday(0)
+        for doctor, value in [(self.doctor, '10:00'), (self.doctor, '09:00'), (self.other_doctor, '09:00')]:
+            book_slot(self.patient, doctor, self.day, self.slot(value), 'Cough, fever', self.patient.user)
+        self.url = reverse('appointments:export_appointments')
+
+    def export(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get(self.url, params)
+
+    def test_doctor_csv_export_streams_own_appointments(self):
+        response = self.export(self.doctor.user)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(tuple(rows[0]), exports.COLUMNS)
+        self.assertEqual([(row[2], row[4]) for row in rows[1:]], [('09:00', 'MEDTEST1'), ('10:00', 'MEDTEST1')])
+        self.assertEqual(rows[1][8], 'Cough, fever')
+
+    def test_staff_jsonl_export(self):
+        staff = User.objects.create_user(username='staff', password='staff123', is_staff=True)
+        response = self.export(staff, format='jsonl', doctor=self.other_doctor.id, start=self.day.isoformat())
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row['doctor_license'], row['patient_username']) for row in rows], [('MEDTEST2', 'patient_test')])
+        self.assertEqual(len(list(self.export(staff, format='jsonl').streaming_content)), 3)
+
+    def test_rejected_requests(self):
+        self.assertEqual(self.export(self.patient.user).status_code, 403)
+        self.assertEqual(self.export(self.doctor.user, format='xml').status_code, 400)
+        self.assertEqual(self.export(self.doctor.user, start='monday').status_code, 400)
+
+    async def test_asgi_export_streams_without_buffering(self):
+        await sync_to_async(self.async_client.force_login)(self.doctor.user)
+        response = await self.async_client.get(self.url)
+        self.assertTrue(response.is_async)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            content = b''.join([part async for part in response])
+        rows = list(csv.reader(content.decode().splitlines()))
+        self.assertEqual([row[2] for row in rows[1:]], ['09:00', '10:00'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'reads the SQLite query plan')
+    def test_exports_stream_in_index_order(self):
+        for doctor in (self.doctor, None):
+            plan = exports.appointments_for(doctor=doctor, start=self.day).explain()
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_slot_missing_from_registry(self):
+        with mock.patch.object(timeslots, 'get_slot', return_value=None):
+            rows = list(exports.export_rows(exports.appointments_for(doctor=self.doctor)))
+        self.assertEqual([row[2] for row in rows], ['09:00', '10:00'])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_appointments', '--doctor', 'MEDTEST2', '--format', 'jsonl', stdout=out)
+        self.assertEqual([json.loads(line)['time'] for line in out.getvalue().splitlines()], ['09:00'])
+        with self.assertRaises(CommandError):
+            call_command('export_appointments', '--doctor', 'NOPE')
+
+
+@override_settings(SESSION_ENGINE='medibook.sessions', SESSION_SAVE_EVERY_REQUEST=True, SESSION_REFRESH_SECONDS=3600)
+class SessionWriteTests(MediBookTestCase):
+    url = reverse_lazy('appointments:patient_dashboard')
+
+    def session_writes(self):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        return [
+            query['sql'] for query in context.captured_queries
+            if 'django_session' in query['sql'] and not query['sql'].startswith('SELECT')
+        ]
+
+    def test_read_only_requests_do_not_write_the_session(self):
+        self.client.force_login(self.patient.user)
+        self.session_writes()
+        self.assertEqual(self.session_writes(), [])
+        self.assertEqual(self.session_writes(), [])
+
+    def test_expiry_is_refreshed_after_the_threshold(self):
+        self.client.force_login(self.patient.user)
+        self.session_writes()
+        later = timezone.now() + timedelta(seconds=3601)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(len(self.session_writes()), 1)
+            self.assertEqual(self.session_writes(), [])
+
+    def test_changed_session_is_written(self):
+        from medibook.sessions import SessionStore
+
+        session = SessionStore()
+        session['theme'] = 'light'
+        session.create()
+        loaded = SessionStore(session.session_key)
+        with CaptureQueriesContext(connection) as context:
+            loaded['theme']
+            loaded.save()
+            loaded['theme'] = 'dark'
+            loaded.save()
+        self.assertEqual(len([query for query in context.captured_queries if 'UPDATE' in query['sql']]), 1)
+        self.assertEqual(SessionStore(session.session_key)['theme'], 'dark')
+
+    def test_logout_ends_the_session_in_every_worker(self):
+        from django.core.cache.backends.locmem import LocMemCache
+        from medibook.sessions import SessionStore
+
+        self.client.force_login(self.patient.user)
+        session_key = self.client.session.session_key
+        # A second worker, with its own process-local cache, has seen the session
+        other_worker = mock.patch(
+            'django.contrib.sessions.backends.cached_db.caches', {'default': LocMemCache('other-worker', {})}
+        )
+        with other_worker:
+            self.assertIn('_auth_user_id', SessionStore(session_key).load())
+
+        SessionStore(session_key).flush()
+
+        with other_worker:
+            self.assertEqual(SessionStore(session_key).load(), {})
+        response = self.client.get(self.url)
+        self.assertRedirects(response, f"{reverse('accounts:login')}?next={self.url}", fetch_redirect_response=False)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    def test_process_local_cache_is_reported(self):
+        from .checks import check_shared_cache
+
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ['appointments.W001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class SQLiteProfileTests(TestCase):
+    def connect(self, **settings_dict):
+        from medibook.backends.sqlite3.base import DatabaseWrapper
+
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        base = {**connection.settings_dict, 'NAME': os.path.join(workdir.name, 'profile.sqlite3'), **settings_dict}
+        wrapper = DatabaseWrapper(base, alias='profile')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        wrapper = self.connect(PRAGMAS={'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_immediate_transactions(self):
+        wrapper = self.connect(TRANSACTION_MODE='IMMEDIATE')
+        statements = []
+        with wrapper.execute_wrapper(lambda execute, sql, *args: statements.append(sql) or execute(sql, *args)):
+            wrapper._start_transaction_under_autocommit()
+        self.assertEqual(statements, ['BEGIN IMMEDIATE'])
+        self.assertTrue(wrapper.connection.in_transaction)
+        wrapper.connection.rollback()
+
+
+class ReplicaRoutingTests(MediBookTestCase):
+    """Routing decisions, whether or not a replica is configured."""
+
+    def with_replica(self, configured=True):
+        return mock.patch.object(routers, 'replica_configured', return_value=configured)
+
+    def test_reads_use_the_replica_only_when_asked(self):
+        with self.with_replica():
+            self.assertEqual(router.db_for_read(Appointment), 'default')
+            with routers.replica_reads():
+                self.assertEqual(router.db_for_read(Appointment), 'replica')
+                self.assertEqual(router.db_for_write(Appointment), 'default')
+        with self.with_replica(False), routers.replica_reads():
+            self.assertEqual(router.db_for_read(Appointment), 'default')
+
+    def test_pinned_requests_read_from_the_primary(self):
+        state = routers._RequestState(pinned=True)
+        token = routers._request_state.set(state)
+        self.addCleanup(routers._request_state.reset, token)
+        with self.with_replica(), routers.replica_reads():
+            self.assertEqual(router.db_for_read(Appointment), 'default')
+
+    def test_writes_pin_the_client(self):
+        self.client.force_login(self.patient.user)
+        url = reverse('appointments:book_appointment', args=[self.doctor.id])
+        data = {'appointment_date': next_weekday(0).isoformat(), 'appointment_time': self.slot('09:00').id}
+        with self.with_replica(False):
+            self.assertNotIn(routers.PIN_COOKIE, self.client.post(url, data).cookies)
+        with self.with_replica():
+            data['appointment_time'] = self.slot('10:00').id
+            response = self.client.post(url, data)
+            self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+            self.assertNotIn(routers.PIN_COOKIE, self.client.get(reverse('home')).cookies)
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs DATABASE_PROFILE=sqlite-replica')
+class ReplicaDatabaseTests(MediBookTestCase):
+    """
+    Runs with two SQLite files standing in for the primary and the replica:
+
+        DATABASE_PROFILE=sqlite-replica python manage.py test appointments.tests.ReplicaDatabaseTests
+
+    Nothing copies data between them, so whatever a page shows tells which
+    one it read.
+    """
+
+    databases = set(settings.DATABASES) & {'default', 'replica'}
+    replica_reads = True
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.patient.user)
+
+    def replica_queries(self, url):
+        with CaptureQueriesContext(connections['replica']) as context:
+            response = self.client.get(url)
+        return response, len(context.captured_queries)
+
+    def test_dashboard_and_directory_read_the_replica(self):
+        response, queries = self.replica_queries(reverse('appointments:patient_dashboard'))
+        # The patient only exists on the primary
+        self.assertEqual(response.status_code, 404)
+        self.assertGreater(queries, 0)
+        response, queries = self.replica_queries(reverse('appointments:doctor_list'))
+        self.assertEqual(list(response.context['doctors']), [])
+
+    def test_missing_stats_row_is_built_from_and_read_on_the_primary(self):
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=next_weekday(0),
+            appointment_time=self.slot('09:00')
+        )
+        PatientStats.objects.filter(pk=self.patient.pk).delete()
+        with routers.replica_reads():
+            patient_stats = stats.get_stats(PatientStats, self.patient.pk)
+        self.assertEqual(patient_stats.pending_count, 1)
+
+    def test_booking_reads_its_own_write(self):
+        day = next_weekday(0)
+        response = self.client.post(reverse('appointments:book_appointment', args=[self.doctor.id]), {
+            'appointment_date': day.isoformat(),
+            'appointment_time': self.slot('09:00').id,
+        })
+        self.assertEqual(response.url, reverse('appointments:patient_dashboard'))
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        response, queries = self.replica_queries(response.url)
+        self.assertEqual(queries, 0)
+        self.assertEqual([appointment.appointment_date for appointment in response.context['upcoming_appointments']], [day])
+
+
+class AsyncViewTests(MediBookTestCase):
+    """The async variants, called directly as an ASGI worker would."""
+
+    def request(self, factory, url, user=None, **params):
+        from importlib import import_module
+        from django.contrib.auth.models import AnonymousUser
+        from django.contrib.messages.storage import default_storage
+
+        request = factory.get(url, params)
+        request.user = user or AnonymousUser()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        request._messages = default_storage(request)
+        return request
+
+    async def test_patient_dashboard(self):
+        day = next_weekday(0)
+        await Appointment.objects.acreate(
+            patient=self.patient, doctor=self.doctor, appointment_date=day,
+            appointment_time=await TimeSlot.objects.aget(time='09:00')
+        )
+        url = reverse('appointments:patient_dashboard')
+        response = await async_views.patient_dashboard(self.request(AsyncRequestFactory(), url, self.patient.user))
+        self.assertContains(response, 'Dr. Test Doctor')
+        self.assertContains(response, '09:00 AM')
+
+        response = await async_views.patient_dashboard(self.request(AsyncRequestFactory(), url))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('accounts:login'), response.url)
+
+    async def test_doctor_dashboard(self):
+        url = reverse('appointments:doctor_dashboard')
+        response = await async_views.doctor_dashboard(self.request(AsyncRequestFactory(), url, self.doctor.user))
+        self.assertContains(response, 'Welcome, Dr. Test!')
+
+    async def test_dashboard_fragments_read_the_cache_off_the_event_loop(self):
+        from django.core.cache.backends.locmem import LocMemCache
+
+        on_loop = []
+        real_get = LocMemCache.get
+
+        def get(cache, key, *args, **kwargs):
+            if key.startswith('template.cache.'):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append(key)
+                except RuntimeError:
+                    pass
+            return real_get(cache, key, *args, **kwargs)
+
+        with mock.patch.object(LocMemCache, 'get', get):
+            for view, user in ((async_views.patient_dashboard, self.patient.user),
+                               (async_views.doctor_dashboard, self.doctor.user)):
+                response = await view(self.request(AsyncRequestFactory(), '/', user))
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(on_loop, [])
+
+    async def test_slot_lookups_match_the_sync_views(self):
+        day = next_weekday(0)
+        url = reverse('appointments:doctor_slots_range', args=[self.doctor.id])
+        params = {'start': day.isoformat(), 'end': (day + timedelta(days=6)).isoformat()}
+        response = await async_views.doctor_slots_range(
+            self.request(AsyncRequestFactory(), url, self.patient.user, **params), self.doctor.id
+        )
+        expected = await sync_to_async(views.doctor_slots_range)(
+            self.request(RequestFactory(), url, self.patient.user, **params), self.doctor.id
+        )
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+        params = {'date': 'tomorrow'}
+        response = await async_views.doctor_slots(self.request(AsyncRequestFactory(), url, **params), self.doctor.id)
+        self.assertEqual(response.status_code, 400)
+
+
+class DashboardFragmentTests(MediBookTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.day = next_weekday(0)
+
+    def book(self, value='09:00'):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment, rebooked = book_slot(
+                self.patient, self.doctor, self.day, self.slot(value), '', self.patient.user
+            )
+        return appointment
+
+    def dashboard(self, user, name):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(f'appointments:{name}'))
+        list_queries = [
+            query for query in context.captured_queries
+            if 'FROM "appointments_appointment"' in query['sql'] and 'COUNT(' not in query['sql']
+        ]
+        return response.content.decode(), len(list_queries)
+
+    def test_repeated_loads_render_the_lists_from_cache(self):
+        from django.core.cache.utils import make_template_fragment_key
+
+        self.book()
+        first, queries = self.dashboard(self.patient.user, 'patient_dashboard')
+        self.assertEqual(queries, 2)
+        key = fragments.key('patient', self.patient.pk)
+        self.assertIsNotNone(cache.get(make_template_fragment_key('patient_upcoming', [key])))
+        second, queries = self.dashboard(self.patient.user, 'patient_dashboard')
+        self.assertEqual(first, second)
+        # The async views load their lists before rendering
+        if not settings.ASYNC_VIEWS:
+            self.assertEqual(queries, 0)
+            self.assertEqual(self.dashboard(self.doctor.user, 'doctor_dashboard')[1], 2)
+            self.assertEqual(self.dashboard(self.doctor.user, 'doctor_dashboard')[1], 0)
+
+    def test_booking_cancelling_and_status_changes_invalidate(self):
+        appointment = self.book()
+        self.dashboard(self.patient.user, 'patient_dashboard')
+        self.dashboard(self.doctor.user, 'doctor_dashboard')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.update_appointment_status(appointment, 'confirmed')
+        content, queries = self.dashboard(self.patient.user, 'patient_dashboard')
+        self.assertEqual(queries, 2)
+        self.assertIn('Confirmed', content)
+        self.assertEqual(self.dashboard(self.doctor.user, 'doctor_dashboard')[1], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.cancel_appointment(appointment, self.patient.user)
+        content, queries = self.dashboard(self.patient.user, 'patient_dashboard')
+        self.assertEqual(queries, 2)
+        self.assertIn('No Upcoming Appointments', content)
+
+        self.book('10:00')
+        content, queries = self.dashboard(self.patient.user, 'patient_dashboard')
+        self.assertIn('10:00 AM', content)
+
+    def test_fragments_expire_with_the_clock(self):
+        self.book()
+        self.dashboard(self.patient.user, 'patient_dashboard')
+        later = timezone.now() + timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.dashboard(self.patient.user, 'patient_dashboard')[1], 2)
+
+    def test_evicted_version_is_not_reused(self):
+        key = fragments.key('patient', self.patient.pk)
+        cache.delete(fragments._version_key('patient', self.patient.pk))
+        self.assertNotEqual(fragments.key('patient', self.patient.pk), key)
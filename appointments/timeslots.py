@@ -0,0 +1,66 @@
+"""
+Process-wide registry of the ``TimeSlot`` rows.
+
+The table holds one row per ``TimeSlot.TIME_CHOICES`` entry and practically
+never changes, so each worker loads it once, on first use, and serves id and
+time lookups from memory. Saving or deleting a ``TimeSlot`` drops the
+registry (see ``signals``) and the next lookup reloads it. An empty table
+is never kept, so a worker started before the slots were populated (by
+another process, which fires no signals here) picks them up once they exist.
+
+The registry hands out shared ``TimeSlot`` instances; treat them as
+read-only.
+"""
+from .models import TimeSlot
+
+
+class Registry:
+    """An immutable snapshot of the ``TimeSlot`` table."""
+
+    def __init__(self, slots):
+        self.slots = tuple(sorted(slots, key=lambda slot: slot.time))
+        self.by_id = {slot.id: slot for slot in self.slots}
+        self.by_time = {slot.time: slot for slot in self.slots}
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    registry = _registry
+    if registry is None:
+        # Built aside and swapped in whole, so concurrent readers never see
+        # a half-filled registry
+        registry = Registry(TimeSlot.objects.all())
+        if registry.slots:
+            _registry = registry
+    return registry
+
+
+def invalidate():
+    """Drop the registry; the next lookup reloads it from the database."""
+    global _registry
+    _registry = None
+
+
+def all_slots():
+    """Return every time slot, in time order."""
+    return get_registry().slots
+
+
+def get_slot(slot_id):
+    """
+    Return the time slot with primary key ``slot_id`` (an int or a numeric
+    string), or ``None`` if there is none.
+    """
+    try:
+        slot_id = int(slot_id)
+    except (TypeError, ValueError):
+        return None
+    return get_registry().by_id.get(slot_id)
+
+
+def get_slot_by_time(value):
+    """Return the time slot starting at ``value`` (``'HH:MM'``), or ``None``."""
+    return get_registry().by_time.get(value)
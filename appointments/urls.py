@@ -1,14 +1,27 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the read-heavy pages are served by their async variants
+if settings.ASYNC_VIEWS:
+    from . import async_views as read_views
+else:
+    read_views = views
+
 app_name = 'appointments'
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
-    path('patient/', views.patient_dashboard, name='patient_dashboard'),
-    path('doctor/', views.doctor_dashboard, name='doctor_dashboard'),
-    path('doctors/', views.doctor_list, name='doctor_list'),
+    path('patient/', read_views.patient_dashboard, name='patient_dashboard'),
+    path('doctor/', read_views.doctor_dashboard, name='doctor_dashboard'),
+    path('doctors/', read_views.doctor_list, name='doctor_list'),
+    path('doctors/json/', views.doctor_list_json, name='doctor_list_json'),
+    path('doctors/soonest/', views.soonest_available, name='soonest_available'),
     path('book/<int:doctor_id>/', views.book_appointment, name='book_appointment'),
+    path('<int:doctor_id>/slots/', read_views.doctor_slots, name='doctor_slots'),
+    path('<int:doctor_id>/slots/range/', read_views.doctor_slots_range, name='doctor_slots_range'),
+    path('<int:doctor_id>/hold/', views.hold_appointment_slot, name='hold_appointment_slot'),
+    path('export/', views.export_appointments, name='export_appointments'),
     path('cancel/<int:appointment_id>/', views.cancel_appointment, name='cancel_appointment'),
     path('update-status/<int:appointment_id>/', views.update_appointment_status, name='update_appointment_status'),
 ]
@@ -1,11 +1,18 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, Http404, StreamingHttpResponse
+from django.db import DatabaseError, router
+from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import Appointment, Doctor, TimeSlot, DoctorAvailability, AppointmentHistory
+from .models import Appointment, Doctor
+from . import availability, directory, exports, finder, fragments, search, services, stats, timeslots
+from .models import DoctorStats, PatientStats
 from accounts.models import Patient
+from medibook.routers import use_replica
 
 
 def dashboard(request):
@@ -18,6 +25,7 @@ def dashboard(request):
 
 
 @login_required
+@use_replica
 def patient_dashboard(request):
     if request.user.user_type != 'patient':
         return redirect('appointments:doctor_dashboard')
@@ -26,40 +34,41 @@ def patient_dashboard(request):
     from datetime import date
     today = date.today()
     
-    upcoming_appointments = Appointment.objects.filter(
-        patient=patient,
+    appointments = Appointment.objects.filter(patient=patient)
+    
+    # Date-relative counters come from one conditional aggregation, the
+    # rest from the maintained counters
+    counts = appointments.aggregate(
+        upcoming_count=Count('id', filter=Q(appointment_date__gte=today, status__in=['pending', 'confirmed'])),
+        past_count=Count('id', filter=Q(appointment_date__lt=today)),
+    )
+    counts['total_appointments'] = stats.get_stats(PatientStats, patient.pk).total_appointments
+    
+    # The templates show the doctor's name for every row; slots come from
+    # the in-process registry
+    appointments = appointments.select_related('doctor__user')
+    
+    upcoming_appointments = appointments.filter(
         appointment_date__gte=today,
         status__in=['pending', 'confirmed']
     ).order_by('appointment_date', 'appointment_time')
     
-    past_appointments = Appointment.objects.filter(
-        patient=patient,
+    past_appointments = appointments.filter(
         appointment_date__lt=today
     ).order_by('-appointment_date', '-appointment_time')[:5]
     
-    # Calculate counts
-    total_appointments = Appointment.objects.filter(
-        patient=patient,
-        status__in=['pending', 'confirmed', 'completed']
-    ).count()
-    
-    upcoming_count = upcoming_appointments.count()
-    past_count = Appointment.objects.filter(
-        patient=patient,
-        appointment_date__lt=today
-    ).count()
-    
     context = {
         'upcoming_appointments': upcoming_appointments,
         'past_appointments': past_appointments,
-        'total_appointments': total_appointments,
-        'upcoming_count': upcoming_count,
-        'past_count': past_count,
+        'fragment_key': fragments.key('patient', patient.pk),
+        'fragment_timeout': settings.FRAGMENT_CACHE_SECONDS,
+        **counts,
     }
     return render(request, 'appointments/patient_dashboard.html', context)
 
 
 @login_required
+@use_replica
 def doctor_dashboard(request):
     if request.user.user_type != 'doctor':
         return redirect('appointments:patient_dashboard')
@@ -68,56 +77,139 @@ def doctor_dashboard(request):
     from datetime import date
     today = date.today()
     
-    today_appointments = Appointment.objects.filter(
-        doctor=doctor,
+    appointments = Appointment.objects.filter(doctor=doctor)
+    
+    # Date-relative counters come from one conditional aggregation, the
+    # rest from the maintained counters
+    counts = appointments.filter(
+        appointment_date__gte=today,
+        status__in=['pending', 'confirmed']
+    ).aggregate(
+        today_count=Count('id', filter=Q(appointment_date=today)),
+        upcoming_count=Count('id', filter=Q(appointment_date__gt=today)),
+    )
+    counts['total_patients'] = stats.get_stats(DoctorStats, doctor.pk).total_patients
+    
+    # The templates show the patient's name and phone for every row; slots
+    # come from the in-process registry
+    appointments = appointments.select_related('patient__user')
+    
+    today_appointments = appointments.filter(
         appointment_date=today,
         status__in=['pending', 'confirmed']
     ).order_by('appointment_time')
     
-    upcoming_appointments = Appointment.objects.filter(
-        doctor=doctor,
+    upcoming_appointments = appointments.filter(
         appointment_date__gt=today,
         status__in=['pending', 'confirmed']
     ).order_by('appointment_date', 'appointment_time')[:10]
     
-    # Calculate counts
-    today_count = today_appointments.count()
-    upcoming_count = Appointment.objects.filter(
-        doctor=doctor,
-        appointment_date__gt=today,
-        status__in=['pending', 'confirmed']
-    ).count()
-    
-    total_patients = Appointment.objects.filter(
-        doctor=doctor,
-        status__in=['pending', 'confirmed', 'completed']
-    ).values('patient').distinct().count()
-    
     context = {
+        'doctor': doctor,
         'today_appointments': today_appointments,
         'upcoming_appointments': upcoming_appointments,
-        'today_count': today_count,
-        'upcoming_count': upcoming_count,
-        'total_patients': total_patients,
+        'fragment_key': fragments.key('doctor', doctor.pk),
+        'fragment_timeout': settings.FRAGMENT_CACHE_SECONDS,
+        **counts,
     }
     return render(request, 'appointments/doctor_dashboard.html', context)
 
 
-def doctor_list(request):
-    doctors = Doctor.objects.filter(is_available=True).select_related('user')
+def _directory_page(request):
     specialization = request.GET.get('specialization')
+    cursors = {}
+    for name in ('after', 'before'):
+        try:
+            cursors[name] = int(request.GET[name])
+        except (KeyError, ValueError):
+            cursors[name] = None
+    page_size = directory.page_size_from(request.GET.get('page_size'))
     
-    if specialization:
-        doctors = doctors.filter(specialization=specialization)
-    
-    specializations = Doctor.SPECIALIZATION_CHOICES
+    # Served from the cached directory, including the per-specialization counts
+    page, specializations = directory.get_directory(specialization, page_size=page_size, **cursors)
     
-    context = {
-        'doctors': doctors,
+    # Searches show the best matches, ranked, instead of paging by id
+    query = request.GET.get('q', '').strip()
+    if query:
+        page = directory.Page(search.search(query, specialization, limit=page_size), None, None)
+    return specialization, query, page_size, page, specializations
+
+
+def _doctor_list_context(request):
+    specialization, query, page_size, page, specializations = _directory_page(request)
+    return {
+        'doctors': page.doctors,
+        'page': page,
+        'page_size': page_size,
         'specializations': specializations,
         'selected_specialization': specialization,
+        'query': query,
     }
-    return render(request, 'appointments/doctor_list.html', context)
+
+
+@use_replica
+def doctor_list(request):
+    return render(request, 'appointments/doctor_list.html', _doctor_list_context(request))
+
+
+@use_replica
+def doctor_list_json(request):
+    specialization, query, page_size, page, specializations = _directory_page(request)
+    
+    return JsonResponse({
+        'doctors': [
+            {
+                'id': doctor.id,
+                'name': f"Dr. {doctor.user.first_name} {doctor.user.last_name}",
+                'specialization': doctor.specialization,
+                'specialization_display': doctor.get_specialization_display(),
+                'experience_years': doctor.experience_years,
+                'consultation_fee': str(doctor.consultation_fee),
+                'bio': doctor.bio,
+            }
+            for doctor in page.doctors
+        ],
+        'query': query,
+        'previous': page.previous_cursor,
+        'next': page.next_cursor,
+        'page_size': page_size,
+        'facets': [
+            {'specialization': value, 'label': label, 'count': count}
+            for value, label, count in specializations
+        ],
+    })
+
+
+def soonest_available(request):
+    dates = _slots_range(request, default_days=7)
+    if isinstance(dates, JsonResponse):
+        return dates
+    start, end = dates
+    
+    specialization = request.GET.get('specialization')
+    limit = directory.page_size_from(request.GET.get('limit'))
+    openings = finder.soonest_available(specialization, start, end, limit, request.user.id)
+    
+    return JsonResponse({
+        'specialization': specialization,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'doctors': [
+            {
+                'id': doctor.id,
+                'name': f"Dr. {doctor.user.first_name} {doctor.user.last_name}",
+                'specialization': doctor.specialization,
+                'specialization_display': doctor.get_specialization_display(),
+                'date': day.isoformat(),
+                'slot': {
+                    'id': slot_id,
+                    'time': availability.SLOT_TIMES[index],
+                    'label': availability.SLOT_LABELS[index],
+                },
+            }
+            for doctor, day, index, slot_id in openings
+        ],
+    })
 
 
 @login_required
@@ -146,71 +238,38 @@ def book_appointment(request, doctor_id):
             return redirect('appointments:book_appointment', doctor_id=doctor_id)
         
         # Get the time slot
-        try:
-            appointment_time = TimeSlot.objects.get(id=appointment_time_id)
-        except TimeSlot.DoesNotExist:
+        appointment_time = timeslots.get_slot(appointment_time_id)
+        if appointment_time is None:
             messages.error(request, 'Invalid time slot selected.')
             return redirect('appointments:book_appointment', doctor_id=doctor_id)
         
-        # Check for any existing appointment (including cancelled ones)
-        existing = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time
-        ).first()
-        
         try:
-            if existing:
-                if existing.status in ['pending', 'confirmed']:
-                    messages.error(request, 'This time slot is already booked.')
-                    return redirect('appointments:book_appointment', doctor_id=doctor_id)
-                
-                # If it's a cancelled appointment, update it instead of creating a new one
-                existing.patient = patient
-                existing.status = 'pending'
-                existing.symptoms = symptoms
-                existing.notes = ''  # Clear any previous notes
-                existing.save()
-                
-                # Log the status change
-                AppointmentHistory.objects.create(
-                    appointment=existing,
-                    changed_by=request.user,
-                    old_status='cancelled',
-                    new_status='pending',
-                    change_reason='Appointment rebooked after cancellation'
-                )
-                
-                messages.success(request, 'Appointment rebooked successfully!')
-                return redirect('appointments:patient_dashboard')
-            
-            # Create a new appointment if no existing one found
-            appointment = Appointment.objects.create(
+            appointment, rebooked = services.book_slot(
                 patient=patient,
                 doctor=doctor,
                 appointment_date=appointment_date,
                 appointment_time=appointment_time,
-                symptoms=symptoms
+                symptoms=symptoms,
+                changed_by=request.user
             )
-            
-            # Log the appointment creation
-            AppointmentHistory.objects.create(
-                appointment=appointment,
-                changed_by=request.user,
-                old_status='',
-                new_status='pending',
-                change_reason='New appointment created'
-            )
-            
-            messages.success(request, 'Appointment booked successfully!')
-            return redirect('appointments:patient_dashboard')
-            
-        except Exception as e:
-            messages.error(request, f'Error processing appointment: {str(e)}')
+        except services.SlotClosed:
+            messages.error(request, 'The doctor is not available at this time.')
             return redirect('appointments:book_appointment', doctor_id=doctor_id)
+        except services.SlotUnavailable:
+            messages.error(request, 'This time slot is already booked.')
+            return redirect('appointments:book_appointment', doctor_id=doctor_id)
+        except DatabaseError:
+            messages.error(request, 'We could not complete your booking right now. Please try again.')
+            return redirect('appointments:book_appointment', doctor_id=doctor_id)
+        
+        if rebooked:
+            messages.success(request, 'Appointment rebooked successfully!')
+        else:
+            messages.success(request, 'Appointment booked successfully!')
+        return redirect('appointments:patient_dashboard')
     
     # Get available time slots
-    time_slots = TimeSlot.objects.all()
+    time_slots = timeslots.all_slots()
     
     context = {
         'doctor': doctor,
@@ -219,6 +278,141 @@ def book_appointment(request, doctor_id):
     return render(request, 'appointments/book_appointment.html', context)
 
 
+def _slots_day(request):
+    """Return the requested date, or an error response."""
+    try:
+        day = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date format. Please use YYYY-MM-DD format.'}, status=400)
+    
+    if day < timezone.localdate():
+        return JsonResponse({'error': 'Cannot book appointments in the past.'}, status=400)
+    return day
+
+
+def _slots_response(doctor_id, day, entry, user_id):
+    if entry is None:
+        raise Http404('Doctor not found')
+    
+    # A patient's own hold still shows as free to them; started slots don't
+    return JsonResponse({
+        'doctor_id': doctor_id,
+        'date': day.isoformat(),
+        'bitmap': availability.free_mask(entry, user_id, day),
+        'slots': availability.free_slots(entry, user_id, day),
+    })
+
+
+def doctor_slots(request, doctor_id):
+    day = _slots_day(request)
+    if isinstance(day, JsonResponse):
+        return day
+    return _slots_response(doctor_id, day, availability.get_day(doctor_id, day), request.user.id)
+
+
+def _slots_range(request, default_days=None):
+    """
+    Return the requested ``(start, end)``, or an error response. With
+    ``default_days``, a missing start means today and a missing end means
+    ``default_days`` days from the start.
+    """
+    start = request.GET.get('start', '')
+    end = request.GET.get('end', '')
+    try:
+        if default_days and not start:
+            start = timezone.localdate()
+        else:
+            start = datetime.strptime(start, '%Y-%m-%d').date()
+        if default_days and not end:
+            end = start + timedelta(days=default_days - 1)
+        else:
+            end = datetime.strptime(end, '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date format. Please use YYYY-MM-DD format.'}, status=400)
+    
+    if start < timezone.localdate():
+        return JsonResponse({'error': 'Cannot book appointments in the past.'}, status=400)
+    
+    if end < start:
+        return JsonResponse({'error': 'End date must not be before start date.'}, status=400)
+    
+    if (end - start).days >= availability.MAX_RANGE_DAYS:
+        return JsonResponse({'error': f'Date range cannot exceed {availability.MAX_RANGE_DAYS} days.'}, status=400)
+    return start, end
+
+
+def _slots_range_response(doctor_id, start, end, entries, user_id):
+    if entries is None:
+        raise Http404('Doctor not found')
+    
+    slot_ids = entries[0][2]
+    days = availability.date_range(start, end)
+    bitmaps = [availability.free_mask(entry, user_id, day) for entry, day in zip(entries, days)]
+    first_free = availability.next_free(bitmaps)
+    if first_free is not None:
+        offset, index = first_free
+        first_free = {'date': days[offset].isoformat(), 'id': slot_ids[index], 'time': availability.SLOT_TIMES[index]}
+    return JsonResponse({
+        'doctor_id': doctor_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'slots': [
+            {'id': slot_id, 'time': value, 'label': label}
+            for slot_id, value, label in zip(slot_ids, availability.SLOT_TIMES, availability.SLOT_LABELS)
+        ],
+        'dates': [day.isoformat() for day in days],
+        'bitmaps': bitmaps,
+        'matrix': availability.free_matrix(entries, user_id, days),
+        'free_count': availability.free_count(bitmaps),
+        'next_free': first_free,
+    })
+
+
+def doctor_slots_range(request, doctor_id):
+    dates = _slots_range(request)
+    if isinstance(dates, JsonResponse):
+        return dates
+    start, end = dates
+    entries = availability.get_range(doctor_id, start, end)
+    return _slots_range_response(doctor_id, start, end, entries, request.user.id)
+
+
+@login_required
+def hold_appointment_slot(request, doctor_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required.'}, status=405)
+    
+    if request.user.user_type != 'patient':
+        return JsonResponse({'error': 'Only patients can book appointments.'}, status=403)
+    
+    doctor = get_object_or_404(Doctor, id=doctor_id, is_available=True)
+    patient = get_object_or_404(Patient, user=request.user)
+    
+    try:
+        appointment_date = datetime.strptime(request.POST.get('appointment_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date format. Please use YYYY-MM-DD format.'}, status=400)
+    
+    if appointment_date < timezone.localdate():
+        return JsonResponse({'error': 'Cannot book appointments in the past.'}, status=400)
+    
+    appointment_time = timeslots.get_slot(request.POST.get('appointment_time'))
+    if appointment_time is None:
+        return JsonResponse({'error': 'Invalid time slot selected.'}, status=400)
+    
+    try:
+        hold = services.hold_slot(patient, doctor, appointment_date, appointment_time)
+    except services.SlotClosed:
+        return JsonResponse({'error': 'The doctor is not available at this time.'}, status=409)
+    except services.SlotUnavailable:
+        return JsonResponse({'error': 'This time slot is already booked.'}, status=409)
+    
+    return JsonResponse({
+        'hold_id': hold.id,
+        'expires_at': hold.expires_at.isoformat(),
+    })
+
+
 @login_required
 def cancel_appointment(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id)
@@ -232,23 +426,7 @@ def cancel_appointment(request, appointment_id):
         messages.error(request, 'You can only cancel appointments with your patients.')
         return redirect('appointments:doctor_dashboard')
     
-    if appointment.status in ['pending', 'confirmed']:
-        # Log the status change before updating
-        old_status = appointment.status
-        
-        # Update appointment status to cancelled
-        appointment.status = 'cancelled'
-        appointment.save()
-        
-        # Log the change in AppointmentHistory
-        AppointmentHistory.objects.create(
-            appointment=appointment,
-            changed_by=request.user,
-            old_status=old_status,
-            new_status='cancelled',
-            change_reason='Appointment cancelled by user'
-        )
-        
+    if services.cancel_appointment(appointment, request.user):
         messages.success(request, 'Appointment cancelled successfully. The time slot is now available for new bookings.')
     else:
         messages.error(request, 'This appointment cannot be cancelled.')
@@ -275,10 +453,44 @@ def update_appointment_status(request, appointment_id):
     if request.method == 'POST':
         new_status = request.POST.get('status')
         if new_status in ['pending', 'confirmed', 'completed', 'cancelled']:
-            appointment.status = new_status
-            appointment.save()
+            services.update_appointment_status(appointment, new_status)
             messages.success(request, f'Appointment status updated to {new_status}.')
         else:
             messages.error(request, 'Invalid status.')
     
-    return redirect('appointments:doctor_dashboard')
\ No newline at end of file
+    return redirect('appointments:doctor_dashboard')
+
+
+@login_required
+@use_replica
+def export_appointments(request):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in exports.FORMATS:
+        return JsonResponse({'error': f"Unknown format. Use one of: {', '.join(exports.FORMATS)}."}, status=400)
+    
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        try:
+            dates[name] = datetime.strptime(value, '%Y-%m-%d').date() if value else None
+        except ValueError:
+            return JsonResponse({'error': 'Invalid date format. Please use YYYY-MM-DD format.'}, status=400)
+    
+    # Staff export any doctor (or everyone), doctors their own appointments
+    if request.user.is_staff:
+        doctor_id = request.GET.get('doctor')
+        doctor = get_object_or_404(Doctor, id=doctor_id) if doctor_id else None
+    elif request.user.user_type == 'doctor':
+        doctor = get_object_or_404(Doctor, user=request.user)
+    else:
+        return JsonResponse({'error': 'Only doctors and staff can export appointments.'}, status=403)
+    
+    # The rows are read while the response streams, after the view returns,
+    # so the database is fixed on the queryset now
+    appointments = exports.appointments_for(doctor, **dates).using(router.db_for_read(Appointment))
+    lines = exports.export_lines(appointments, export_format)
+    if isinstance(request, ASGIRequest):
+        lines = exports.aiter_lines(lines)
+    response = StreamingHttpResponse(lines, content_type=exports.FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="appointments.{export_format}"'
+    return response
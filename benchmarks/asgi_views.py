@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+"""
+Compare the sync and async read views under an ASGI server.
+
+Seeds a throwaway SQLite file with ``generate_load_data``, then serves
+``medibook.asgi`` with uvicorn twice, once with ``ASYNC_VIEWS`` off (the sync
+views, run in threads by Django's ASGI handler) and once with it on
+(appointments/async_views.py). Each time, ``--clients`` concurrent clients
+load the dashboards, the doctor list and the slot range lookup for
+``--seconds``. Reports requests/s and latency percentiles per mode.
+
+``--db-latency`` adds a delay to every query in the server, standing in for
+a database across the network, which is where async views pay off:
+
+    python benchmarks/asgi_views.py --clients 64 --db-latency 5
+
+Needs uvicorn (``pip install uvicorn``).
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medibook.settings')
+
+
+MODES = {'sync': False, 'async': True}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve(port, database, async_views, db_latency):
+    """Run uvicorn in a child process against ``database``."""
+    os.environ['ASYNC_VIEWS'] = str(async_views)
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database
+
+    import uvicorn
+    from django.db.backends.signals import connection_created
+
+    if db_latency:
+        def slow(execute, sql, params, many, context):
+            time.sleep(db_latency / 1000)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow)
+
+        connection_created.connect(add_latency, weak=False)
+
+    from medibook.asgi import application
+    uvicorn.run(application, host='127.0.0.1', port=port, log_level='warning', lifespan='off')
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f'Server on port {port} did not start')
+
+
+def get(port, path, cookie):
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('GET', path, headers={'Cookie': cookie})
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.status, (time.perf_counter() - start) * 1000
+
+
+def load(port, pages, clients, seconds):
+    """Have ``clients`` threads cycle through ``pages`` for ``seconds``."""
+    timings, statuses = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(offset):
+        number = offset
+        while time.perf_counter() < deadline:
+            path, cookie = pages[number % len(pages)]
+            number += 1
+            try:
+                status, elapsed = get(port, path, cookie)
+            except OSError:
+                status, elapsed = 0, 0.0
+            with lock:
+                timings.append(elapsed)
+                statuses.append(status)
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    ok = [timing for timing, status in zip(timings, statuses) if status == 200]
+    return {
+        'requests': len(timings),
+        'requests_per_second': round(len(ok) / elapsed, 1),
+        'errors': len(timings) - len(ok),
+        'p50_ms': round(percentile(ok, 0.50), 1) if ok else None,
+        'p99_ms': round(percentile(ok, 0.99), 1) if ok else None,
+        'mean_ms': round(statistics.fmean(ok), 1) if ok else None,
+    }
+
+
+def seed(database, doctors, patients):
+    """Create and fill ``database``; return the pages to load as ``(path, cookie)``."""
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db.models import Count
+    from django.test import Client
+    from django.urls import reverse
+
+    from accounts.models import Doctor, Patient
+
+    devnull = open(os.devnull, 'w')
+    call_command('migrate', verbosity=0, stdout=devnull)
+    call_command('generate_load_data', doctors=doctors, patients=patients, days=30, stdout=devnull)
+
+    def cookie(user):
+        client = Client()
+        client.force_login(user)
+        name = settings.SESSION_COOKIE_NAME
+        return f'{name}={client.cookies[name].value}'
+
+    doctor = Doctor.objects.annotate(total=Count('appointments')).select_related('user').order_by('-total').first()
+    patient = Patient.objects.annotate(total=Count('appointments')).select_related('user').order_by('-total').first()
+    as_patient, as_doctor = cookie(patient.user), cookie(doctor.user)
+    start = date.today() + timedelta(days=1)
+    return [
+        (reverse('appointments:patient_dashboard'), as_patient),
+        (reverse('appointments:doctor_dashboard'), as_doctor),
+        (reverse('appointments:doctor_list'), as_patient),
+        (reverse('appointments:doctor_slots_range', args=[doctor.pk])
+         + f'?start={start.isoformat()}&end={(start + timedelta(days=13)).isoformat()}', as_patient),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=100)
+    parser.add_argument('--patients', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=32, help='Concurrent clients')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--db-latency', type=float, default=0, help='Milliseconds added to every query')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        raise SystemExit('This benchmark needs uvicorn: pip install uvicorn')
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        database = str(Path(workdir) / 'asgi.sqlite3')
+        pages = seed(database, args.doctors, args.patients)
+        context = multiprocessing.get_context('spawn')
+
+        print(f'{args.clients} clients, {args.seconds:g}s per mode, {args.db_latency:g} ms added per query')
+        print(f'{"mode":<8}{"req/s":>9}{"errors":>8}{"p50 ms":>9}{"p99 ms":>9}')
+        for mode, async_views in MODES.items():
+            port = free_port()
+            server = context.Process(target=serve, args=(port, database, async_views, args.db_latency))
+            server.start()
+            try:
+                wait_for(port)
+                load(port, pages, len(pages), 1)  # warm the caches
+                result = results[mode] = load(port, pages, args.clients, args.seconds)
+            finally:
+                server.terminate()
+                server.join()
+            print(
+                f'{mode:<8}{result["requests_per_second"]:>9.1f}{result["errors"]:>8}'
+                f'{result["p50_ms"] or 0:>9.1f}{result["p99_ms"] or 0:>9.1f}'
+            )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'args': vars(args)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
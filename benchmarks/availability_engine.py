@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks for the week-matrix operations in appointments/availability.py.
+
+Builds random schedules in memory (no database) and times projecting weeks
+onto dates, free masks, free counts, next-free lookups and intersections over
+every doctor, next to a per-slot baseline that walks (date, slot) cells:
+
+    python benchmarks/availability_engine.py --doctors 10000 --days 90
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, time as dt_time, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medibook.settings')
+
+import django
+django.setup()
+
+from appointments import availability
+from appointments.availability import SLOT_COUNT
+
+
+def random_schedules(doctors, days, booked_ratio, seed_value):
+    """Return ``(weeks, booked)``: one week matrix and one booked mask per day for each doctor."""
+    rng = random.Random(seed_value)
+    weeks = []
+    booked = []
+    for _ in range(doctors):
+        windows = []
+        for weekday in rng.sample(range(7), rng.randint(3, 6)):
+            start = rng.randint(9, 13)
+            windows.append((weekday, dt_time(start), dt_time(rng.randint(start + 1, 18))))
+        weeks.append(availability.week_matrix(windows))
+        booked.append([
+            sum(1 << index for index in range(SLOT_COUNT) if rng.random() < booked_ratio)
+            for _ in range(days)
+        ])
+    return weeks, booked
+
+
+def timed(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def bitmask_paths(weeks, booked, days):
+    def free_masks():
+        return [
+            [open_mask & ~booked_mask for open_mask, booked_mask in zip(availability.project_week(week, days), row)]
+            for week, row in zip(weeks, booked)
+        ]
+
+    free = free_masks()
+    return {
+        'free_masks': free_masks,
+        'free_count': lambda: [availability.free_count(masks) for masks in free],
+        'next_free': lambda: [availability.next_free(masks) for masks in free],
+        'intersect_pairs': lambda: [
+            availability.free_count(availability.intersect(first, second))
+            for first, second in zip(free, free[1:])
+        ],
+    }
+
+
+def baseline_paths(weeks, booked, days):
+    """The same answers computed cell by cell over lists of booleans."""
+    def free_cells():
+        return [
+            [
+                [bool(week[day.weekday()] >> index & 1) and not booked_mask >> index & 1 for index in range(SLOT_COUNT)]
+                for day, booked_mask in zip(days, row)
+            ]
+            for week, row in zip(weeks, booked)
+        ]
+
+    def first_free(cells):
+        for offset, day_cells in enumerate(cells):
+            for index, free in enumerate(day_cells):
+                if free:
+                    return offset, index
+        return None
+
+    free = free_cells()
+    return {
+        'free_masks': free_cells,
+        'free_count': lambda: [sum(sum(day_cells) for day_cells in cells) for cells in free],
+        'next_free': lambda: [first_free(cells) for cells in free],
+        'intersect_pairs': lambda: [
+            sum(a and b for day_a, day_b in zip(first, second) for a, b in zip(day_a, day_b))
+            for first, second in zip(free, free[1:])
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--booked-ratio', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the timings as JSON to this file')
+    args = parser.parse_args()
+
+    weeks, booked = random_schedules(args.doctors, args.days, args.booked_ratio, args.seed)
+    days = availability.date_range(date.today(), date.today() + timedelta(days=args.days - 1))
+
+    results = {}
+    print(f'{args.doctors} doctors x {args.days} days x {SLOT_COUNT} slots')
+    print(f'{"operation":<18}{"bitmask ms":>12}{"baseline ms":>14}{"speedup":>10}')
+    bitmask = bitmask_paths(weeks, booked, days)
+    baseline = baseline_paths(weeks, booked, days)
+    for name in bitmask:
+        fast, fast_result = timed(bitmask[name], args.repeat)
+        slow, slow_result = timed(baseline[name], args.repeat)
+        if name != 'free_masks' and fast_result != slow_result:
+            raise SystemExit(f'{name}: bitmask and baseline results differ')
+        results[name] = {'bitmask_ms': round(fast, 3), 'baseline_ms': round(slow, 3)}
+        print(f'{name:<18}{fast:>12.1f}{slow:>14.1f}{slow / fast:>9.1f}x')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'args': vars(args)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+"""
+Measure latency percentiles and query counts of the core views.
+
+Generates a dataset with ``generate_load_data`` in a throwaway in-memory
+database, then drives the views through Django's test client: the doctor
+list, the booking page (GET and POST), both dashboards and the login page
+(GET and POST). The dashboards are measured with their template fragments
+cached and, to show what the fragment cache saves, with them invalidated
+before every request. Results can be written as JSON and compared with an
+earlier run:
+
+    python benchmarks/core_views.py --output before.json
+    python benchmarks/core_views.py --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medibook.settings')
+
+import django
+django.setup()
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.template.backends.django import Template
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from accounts.models import Doctor, Patient
+from appointments import availability, fragments
+
+
+PASSWORD = 'bench123'
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def summarise(timings, queries, statuses, renders):
+    return {
+        'requests': len(timings),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p90_ms': round(percentile(timings, 0.90), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'max_ms': round(max(timings), 3),
+        'render_p50_ms': round(percentile(renders, 0.50), 3),
+        'render_mean_ms': round(statistics.fmean(renders), 3),
+        'queries_mean': round(statistics.fmean(queries), 2),
+        'queries_max': max(queries),
+        'statuses': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def measure(request, requests, warmup):
+    """
+    Call ``request()`` (which returns a response) ``warmup + requests``
+    times and summarise the measured calls, including the time spent
+    rendering templates.
+    """
+    count = [0]
+    rendering = [0.0]
+    render = Template.render
+
+    def counter(execute, sql, params, many, context):
+        count[0] += 1
+        return execute(sql, params, many, context)
+
+    def timed_render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            rendering[0] += (time.perf_counter() - start) * 1000
+
+    for _ in range(warmup):
+        request()
+    timings, queries, statuses, renders = [], [], [], []
+    Template.render = timed_render
+    try:
+        for _ in range(requests):
+            count[0] = 0
+            rendering[0] = 0.0
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(count[0])
+            renders.append(rendering[0])
+            statuses.append(response.status_code)
+    finally:
+        Template.render = render
+    return summarise(timings, queries, statuses, renders)
+
+
+def busiest(model):
+    """Return the doctor/patient with the most appointments."""
+    return model.objects.annotate(total=Count('appointments')).select_related('user').order_by('-total').first()
+
+
+def free_slots(doctor, days):
+    """Yield ``(date, slot_id)`` for every free future slot of ``doctor``."""
+    start = date.today() + timedelta(days=1)
+    end = start + timedelta(days=days - 1)
+    for day, entry in zip(availability.date_range(start, end), availability.build_range(doctor.pk, start, end)):
+        for index in availability.mask_to_indexes(availability.free_mask(entry)):
+            yield day, entry[2][index]
+
+
+def scenarios(doctor, patient):
+    """Return ``{name: request}`` for every measured view."""
+    anonymous = Client()
+    as_patient = Client()
+    as_patient.force_login(patient.user)
+    as_doctor = Client()
+    as_doctor.force_login(doctor.user)
+
+    doctor_list = reverse('appointments:doctor_list')
+    book = reverse('appointments:book_appointment', args=[doctor.pk])
+    login = reverse('accounts:login')
+    slots = free_slots(doctor, 365)
+
+    def book_post():
+        try:
+            day, slot_id = next(slots)
+        except StopIteration:
+            raise SystemExit('Ran out of free slots to book; lower --requests')
+        return as_patient.post(book, {'appointment_date': day.isoformat(), 'appointment_time': slot_id})
+
+    def doctor_list_cold():
+        cache.clear()
+        return anonymous.get(doctor_list)
+
+    def patient_dashboard_cold():
+        fragments.bump('patient', patient.pk)
+        return as_patient.get(reverse('appointments:patient_dashboard'))
+
+    def doctor_dashboard_cold():
+        fragments.bump('doctor', doctor.pk)
+        return as_doctor.get(reverse('appointments:doctor_dashboard'))
+
+    return {
+        'doctor_list': lambda: anonymous.get(doctor_list),
+        'doctor_list (cold cache)': doctor_list_cold,
+        'doctor_list (search)': lambda: anonymous.get(doctor_list, {'q': doctor.user.last_name[:3]}),
+        'book_appointment GET': lambda: as_patient.get(book),
+        'book_appointment POST': book_post,
+        'patient_dashboard': lambda: as_patient.get(reverse('appointments:patient_dashboard')),
+        'patient_dashboard (fragments cold)': patient_dashboard_cold,
+        'doctor_dashboard': lambda: as_doctor.get(reverse('appointments:doctor_dashboard')),
+        'doctor_dashboard (fragments cold)': doctor_dashboard_cold,
+        'login_view GET': lambda: Client().get(login),
+        'login_view POST': lambda: Client().post(login, {'username': patient.user.username, 'password': PASSWORD}),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+    }
+
+
+def compare(results, path):
+    with open(path) as f:
+        previous = json.load(f)['results']
+    print(f'\nCompared with {path}')
+    print(f'{"view":<36}{"p50 ms":>16}{"p99 ms":>18}{"render ms":>16}{"queries":>14}')
+    for name, current in results.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        print(
+            f'{name:<36}'
+            f'{before["p50_ms"]:>7.1f} -> {current["p50_ms"]:<6.1f}'
+            f'{before["p99_ms"]:>8.1f} -> {current["p99_ms"]:<7.1f}'
+            f'{before.get("render_p50_ms", 0):>6.1f} -> {current["render_p50_ms"]:<6.1f}'
+            f'{before["queries_mean"]:>6.1f} -> {current["queries_mean"]:<5.1f}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--requests', type=int, default=100, help='Measured requests per view')
+    parser.add_argument('--login-requests', type=int, default=10,
+                        help='Measured login POSTs (each runs the password hasher)')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Print the change against an earlier JSON result')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    call_command(
+        'generate_load_data', doctors=args.doctors, patients=args.patients, days=args.days,
+        seed=args.seed, password=PASSWORD, stdout=open(os.devnull, 'w')
+    )
+    doctor = busiest(Doctor)
+    patient = busiest(Patient)
+
+    results = {}
+    print(f'{args.doctors} doctors, {args.patients} patients, {args.days} days')
+    print(f'{"view":<36}{"p50 ms":>9}{"p90 ms":>9}{"p99 ms":>9}{"render":>9}{"queries":>9}  statuses')
+    for name, request in scenarios(doctor, patient).items():
+        requests = args.login_requests if name == 'login_view POST' else args.requests
+        warmup = min(args.warmup, requests)
+        result = results[name] = measure(request, requests, warmup)
+        print(
+            f'{name:<36}{result["p50_ms"]:>9.1f}{result["p90_ms"]:>9.1f}{result["p99_ms"]:>9.1f}'
+            f'{result["render_p50_ms"]:>9.1f}{result["queries_mean"]:>9.1f}  {result["statuses"]}'
+        )
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'environment': environment(), 'args': vars(args)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Time ``Appointment.is_past``/``can_cancel`` and a dashboard-style render over
+many appointments, comparing the stored ``start_minute`` column with the
+previous implementation that parsed ``TimeSlot.time`` through the foreign key.
+
+Runs against a throwaway in-memory database:
+
+    python benchmarks/dashboard_render.py --appointments 10000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medibook.settings')
+
+import django
+django.setup()
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.template import Context, Template
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+
+from accounts.models import User, Doctor, Patient
+from appointments.models import TimeSlot, Appointment
+
+
+class LegacyAppointment(Appointment):
+    """The string-parsing ``is_past``/``can_cancel`` this benchmark compares against."""
+
+    class Meta:
+        proxy = True
+        app_label = 'appointments'
+
+    @property
+    def is_past(self):
+        appointment_datetime = datetime.combine(
+            self.appointment_date,
+            datetime.strptime(self.appointment_time.time, '%H:%M').time()
+        )
+        appointment_datetime = timezone.make_aware(appointment_datetime)
+        return appointment_datetime < timezone.now()
+
+    @property
+    def can_cancel(self):
+        return self.status in ['pending', 'confirmed'] and not self.is_past
+
+
+ROWS = Template(
+    '{% for appointment in appointments %}'
+    '<tr><td>{{ appointment.appointment_date }}</td><td>{{ appointment.get_status_display }}</td>'
+    '<td>{% if appointment.can_cancel %}<a href="/cancel/{{ appointment.id }}/">Cancel</a>{% endif %}</td></tr>'
+    '{% endfor %}'
+)
+
+
+def seed(appointments, seed_value):
+    """Create one patient with ``appointments`` rows spread around today."""
+    rng = random.Random(seed_value)
+    password = make_password('bench')
+    slots = [TimeSlot.objects.create(time=value) for value, label in TimeSlot.TIME_CHOICES]
+    doctor_user = User.objects.create(username='doctor', user_type='doctor', password=password)
+    patient_user = User.objects.create(username='patient', user_type='patient', password=password)
+    doctor = Doctor.objects.create(user=doctor_user, specialization='general', license_number='LICBENCH',
+                                   experience_years=5, consultation_fee=500)
+    patient = Patient.objects.create(user=patient_user)
+
+    days = appointments // len(slots) + 1
+    first_day = date.today() - timedelta(days=days // 2)
+    statuses = ['pending', 'confirmed', 'completed', 'cancelled']
+    Appointment.objects.bulk_create([
+        Appointment(
+            patient=patient,
+            doctor=doctor,
+            appointment_date=first_day + timedelta(days=index // len(slots)),
+            appointment_time=slots[index % len(slots)],
+            start_minute=slots[index % len(slots)].minutes,
+            status=rng.choice(statuses),
+        )
+        for index in range(appointments)
+    ], batch_size=2000)
+    return patient
+
+
+def measure(load, run, repeat):
+    """
+    Time ``run`` over freshly loaded rows, leaving the load itself out of
+    the timing but counting every query ``run`` issues.
+    """
+    # Count with a wrapper: the lazy path issues more queries than the
+    # bounded query log keeps
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    timings = []
+    for _ in range(repeat):
+        rows = load()
+        queries.clear()
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            run(rows)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(statistics.median(timings), 3), 'queries': len(queries)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the timings as JSON to this file')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    patient = seed(args.appointments, args.seed)
+
+    def rows(model, related=False):
+        appointments = model.objects.filter(patient=patient)
+        if related:
+            appointments = appointments.select_related('appointment_time')
+        return lambda: list(appointments.all())
+
+    def checks(rows):
+        return [row.can_cancel for row in rows]
+
+    def render(rows):
+        return ROWS.render(Context({'appointments': rows}))
+
+    paths = {
+        'can_cancel (parsed, lazy FK)': (rows(LegacyAppointment), checks),
+        'can_cancel (parsed, select_related)': (rows(LegacyAppointment, related=True), checks),
+        'can_cancel (start_minute)': (rows(Appointment), checks),
+        'render (parsed, select_related)': (rows(LegacyAppointment, related=True), render),
+        'render (start_minute)': (rows(Appointment), render),
+    }
+
+    results = {}
+    print(f'{args.appointments} appointments')
+    print(f'{"path":<40}{"median ms":>12}{"queries":>10}')
+    for name, (load, run) in paths.items():
+        results[name] = measure(load, run, args.repeat)
+        print(f'{name:<40}{results[name]["median_ms"]:>12.1f}{results[name]["queries"]:>10}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'args': vars(args)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
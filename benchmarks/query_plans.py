@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""
+Show how SQLite plans the appointment queries behind the dashboards and the
+slot availability lookups, with and without the composite indexes added in
+appointments/migrations/0004_appointment_indexes.py.
+
+Runs against a throwaway in-memory database:
+
+    python benchmarks/query_plans.py --appointments 50000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, time as dt_time, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medibook.settings')
+
+import django
+django.setup()
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from accounts.models import User, Doctor, Patient
+from appointments import availability, stats
+from appointments.models import TimeSlot, DoctorAvailability, Appointment
+
+
+
+def seed(doctors, patients, appointments, seed_value):
+    """Fill the database with a random but reproducible schedule."""
+    rng = random.Random(seed_value)
+    password = make_password('bench')
+
+    slots = [TimeSlot.objects.create(time=value) for value, label in TimeSlot.TIME_CHOICES]
+    users = User.objects.bulk_create([
+        User(username=f'doctor{i}', first_name='Doc', last_name=str(i), user_type='doctor', password=password)
+        for i in range(doctors)
+    ] + [
+        User(username=f'patient{i}', first_name='Pat', last_name=str(i), user_type='patient', password=password)
+        for i in range(patients)
+    ])
+    doctor_rows = Doctor.objects.bulk_create([
+        Doctor(user=user, specialization='general', license_number=f'LIC{user.username}',
+               experience_years=5, consultation_fee=500)
+        for user in users[:doctors]
+    ])
+    patient_rows = Patient.objects.bulk_create([Patient(user=user) for user in users[doctors:]])
+    DoctorAvailability.objects.bulk_create([
+        DoctorAvailability(doctor=doctor, weekday=weekday, start_time=dt_time(9), end_time=dt_time(18))
+        for doctor in doctor_rows for weekday in range(5)
+    ])
+
+    statuses = ['pending', 'confirmed', 'completed', 'cancelled', 'no_show']
+    days = max(1, appointments // (doctors * 4))
+    first_day = date.today() - timedelta(days=days // 2)
+    rows = set()
+    while len(rows) < appointments:
+        rows.add((rng.randrange(doctors), rng.randrange(days), rng.randrange(len(slots))))
+    Appointment.objects.bulk_create([
+        Appointment(
+            doctor=doctor_rows[doctor],
+            patient=rng.choice(patient_rows),
+            appointment_date=first_day + timedelta(days=day),
+            appointment_time=slots[slot],
+            start_minute=slots[slot].minutes,
+            status=rng.choice(statuses),
+        )
+        for doctor, day, slot in rows
+    ], batch_size=2000)
+    return doctor_rows[0], patient_rows[0]
+
+
+def capture_queries(doctor, patient):
+    """Run the real code paths and return the appointment SQL they issue."""
+    client = Client()
+    captured = {}
+    paths = {
+        'patient_dashboard': lambda: (client.force_login(patient.user), client.get('/appointments/patient/')),
+        'doctor_dashboard': lambda: (client.force_login(doctor.user), client.get('/appointments/doctor/')),
+        'availability_range': lambda: availability.build_range(
+            doctor.pk, date.today(), date.today() + timedelta(days=30)),
+        'stats_distinct_patient': lambda: stats._counted_appointments(doctor.pk, patient.pk).exists(),
+    }
+    for name, run in paths.items():
+        # The capture reads the bounded query log, which seeding filled up
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as context:
+            run()
+        captured[name] = [
+            query['sql'] for query in context.captured_queries
+            if 'FROM "appointments_appointment"' in query['sql']
+        ]
+    return captured
+
+
+def explain(sql, repeat):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        plan = [row[-1] for row in cursor.fetchall()]
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(sql)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+    return plan, statistics.median(timings)
+
+
+def report(label, queries, repeat):
+    print(f'\n=== {label} ===')
+    results = {}
+    for name, statements in queries.items():
+        results[name] = []
+        for sql in statements:
+            plan, elapsed = explain(sql, repeat)
+            results[name].append({'plan': plan, 'median_ms': round(elapsed, 3)})
+            print(f'\n{name} ({elapsed:.3f} ms)')
+            for line in plan:
+                print(f'    {line}')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--appointments', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the plans and timings as JSON to this file')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    doctor, patient = seed(args.doctors, args.patients, args.appointments, args.seed)
+    # The dashboards read the maintained counters
+    call_command('rebuild_stats', stdout=open(os.devnull, 'w'))
+
+    # Drop and re-create the indexes directly, so the rest of the schema
+    # stays at the latest migration
+    indexes = Appointment._meta.indexes
+    with connection.schema_editor() as schema_editor:
+        for index in indexes:
+            schema_editor.remove_index(Appointment, index)
+    connection.cursor().execute('ANALYZE')
+    before = report('Without composite indexes', capture_queries(doctor, patient), args.repeat)
+
+    with connection.schema_editor() as schema_editor:
+        for index in indexes:
+            schema_editor.add_index(Appointment, index)
+    connection.cursor().execute('ANALYZE')
+    after = report('With composite indexes', capture_queries(doctor, patient), args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'before': before, 'after': after, 'args': vars(args)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
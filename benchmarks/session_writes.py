@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Count the session writes behind read-only page views, per session engine.
+
+Logs a patient and a doctor in and has them load their dashboards and the
+doctor list repeatedly, with ``SESSION_SAVE_EVERY_REQUEST`` on as in the
+project settings. Reports the INSERT/UPDATE/DELETE statements on
+``django_session`` per request, the other queries per request and the mean
+latency. Runs against a throwaway in-memory database:
+
+    python benchmarks/session_writes.py --requests 500
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medibook.settings')
+
+import django
+django.setup()
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+
+from accounts.models import Doctor, Patient
+
+
+ENGINES = {
+    'db (previous default)': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'medibook.sessions': 'medibook.sessions',
+}
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def run(engine, requests):
+    """Drive the read-only pages with ``engine`` and summarise the queries."""
+    counts = {'session_writes': 0, 'other_queries': 0}
+
+    def counter(execute, sql, params, many, context):
+        if 'django_session' in sql and sql.lstrip().upper().startswith(WRITES):
+            counts['session_writes'] += 1
+        else:
+            counts['other_queries'] += 1
+        return execute(sql, params, many, context)
+
+    with override_settings(SESSION_ENGINE=engine, SESSION_SAVE_EVERY_REQUEST=True):
+        cache.clear()
+        as_patient = Client()
+        as_patient.force_login(Patient.objects.select_related('user').first().user)
+        as_doctor = Client()
+        as_doctor.force_login(Doctor.objects.select_related('user').first().user)
+        pages = [
+            (as_patient, reverse('appointments:patient_dashboard')),
+            (as_patient, reverse('appointments:doctor_list')),
+            (as_doctor, reverse('appointments:doctor_dashboard')),
+        ]
+        timings = []
+        with connection.execute_wrapper(counter):
+            for number in range(requests):
+                client, url = pages[number % len(pages)]
+                start = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'requests': requests,
+        'session_writes': counts['session_writes'],
+        'session_writes_per_request': round(counts['session_writes'] / requests, 4),
+        'other_queries_per_request': round(counts['other_queries'] / requests, 2),
+        'mean_ms': round(statistics.fmean(timings), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    call_command(
+        'generate_load_data', doctors=args.doctors, patients=args.patients, days=14,
+        stdout=open(os.devnull, 'w')
+    )
+
+    results = {}
+    print(f'{"engine":<24}{"writes/request":>16}{"other queries":>15}{"mean ms":>10}')
+    for name, engine in ENGINES.items():
+        result = results[name] = run(engine, args.requests)
+        print(
+            f'{name:<24}{result["session_writes_per_request"]:>16.3f}'
+            f'{result["other_queries_per_request"]:>15.2f}{result["mean_ms"]:>10.2f}'
+        )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'args': vars(args)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
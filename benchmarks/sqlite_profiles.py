@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Compare concurrent booking under the default and the production SQLite
+profiles (``DATABASE_PROFILE`` in medibook/settings.py).
+
+Runs benchmarks/stress_booking.py once per profile and scenario, each in a
+fresh process since the profile is read when the settings load:
+
+    python benchmarks/sqlite_profiles.py --patients 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+
+HERE = Path(__file__).resolve().parent
+
+PROFILES = ('development', 'production')
+
+SCENARIOS = {
+    'one slot': 1,
+    'spread': 50,
+}
+
+
+def stress(profile, slots, args):
+    with tempfile.TemporaryDirectory() as workdir:
+        output = Path(workdir) / 'result.json'
+        subprocess.run([
+            sys.executable, str(HERE / 'stress_booking.py'),
+            '--patients', str(args.patients), '--slots', str(slots), '--workers', str(args.workers),
+            '--pool', args.pool, '--output', str(output),
+        ], env={**os.environ, 'DATABASE_PROFILE': profile}, stdout=subprocess.DEVNULL, check=False)
+        with open(output) as f:
+            return json.load(f)['results']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--pool', choices=('process', 'thread'), default='process')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"scenario":<12}{"profile":<14}{"req/s":>8}{"errors":>9}{"booked":>9}{"p50 ms":>9}{"p99 ms":>9}')
+    for scenario, slots in SCENARIOS.items():
+        for profile in PROFILES:
+            result = results[f'{scenario} / {profile}'] = stress(profile, slots, args)
+            print(
+                f'{scenario:<12}{profile:<14}{result["requests_per_second"]:>8.1f}'
+                f'{result["error_rate"]:>9.1%}{result["slots_booked"]:>5}/{result["slots"]:<3}'
+                f'{result["p50_ms"]:>9.1f}{result["p99_ms"]:>9.1f}'
+            )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'args': vars(args)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
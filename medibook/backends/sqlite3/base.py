@@ -0,0 +1,18 @@
+"""
+SQLite backend whose transactions can take the write lock up front.
+
+Django 4.2 opens every ``atomic`` block with a plain (deferred) ``BEGIN``.
+A deferred transaction that reads and then writes has to upgrade its lock
+part-way. When another connection is writing, SQLite fails that upgrade
+straight away with "database is locked", whatever the busy timeout.
+``TRANSACTION_MODE = 'IMMEDIATE'`` in the ``DATABASES`` entry starts
+transactions with ``BEGIN IMMEDIATE``, so writers queue on the busy timeout
+instead. This is the ``transaction_mode`` option of Django 5.1.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
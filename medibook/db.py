@@ -0,0 +1,21 @@
+"""
+Per-connection database setup.
+
+SQLite keeps most tuning in per-connection PRAGMAs, which Django has no
+setting for. A ``PRAGMAS`` dict in a ``DATABASES`` entry is applied by the
+``connection_created`` handler below each time a connection is opened.
+Under ``CONN_MAX_AGE`` that happens once per worker rather than once per
+request.
+"""
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS') or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,122 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default`` (the primary). Reads go to the ``replica``
+alias only inside views wrapped with ``use_replica`` (or a
+``replica_reads()`` block): the dashboards, the doctor list and the
+exports. Everything else, bookings and status updates included, reads from
+the primary, so ``select_for_update`` and the read-then-write paths in
+``appointments.services`` never see a lagging copy.
+
+Read-your-writes: ``ReplicaPinMiddleware`` notices when a request wrote to
+the primary and sets a short-lived cookie. While that cookie is present the
+client's replica-eligible pages read from the primary too, so a patient
+who just booked sees the booking on the dashboard they are redirected to.
+
+Without a ``replica`` entry in ``DATABASES`` every read goes to ``default``.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+REPLICA = 'replica'
+
+PIN_COOKIE = 'pin_primary'
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+_request_state = contextvars.ContextVar('replica_request_state', default=None)
+
+
+class _RequestState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def replica_reads():
+    """Send the reads made inside the block to the replica, unless pinned."""
+    state = _request_state.get()
+    token = _replica_reads.set(not (state and state.pinned))
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def use_replica(view):
+    """Decorate a read-mostly view (sync or async) so its queries may use the replica."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and replica_configured():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+class ReplicaPinMiddleware:
+    """Pin a client to the primary for ``REPLICA_PIN_SECONDS`` after it writes."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = _RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        state = _RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.pin(state, response)
+
+    def pin(self, state, response):
+        if state.wrote and replica_configured():
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,46 @@
+"""
+Session engine that keeps ``SESSION_SAVE_EVERY_REQUEST`` from writing on
+every request.
+
+With ``SESSION_SAVE_EVERY_REQUEST`` the session middleware saves after
+every response to slide the expiry forward. Here that save only writes when
+the session data changed or when the last write is more than
+``SESSION_REFRESH_SECONDS`` old, so a read-only page view normally costs
+one session read and no write.
+
+Sessions are stored in the database only (the ``db`` backend). A
+``cached_db`` store would trust each worker's cache first, so with a
+per-process cache a logout in one worker would not end the session in the
+others.
+
+The server-side expiry therefore trails the cookie by at most
+``SESSION_REFRESH_SECONDS``. An idle session lives between
+``SESSION_COOKIE_AGE - SESSION_REFRESH_SECONDS`` and ``SESSION_COOKIE_AGE``.
+Use it with ``SESSION_ENGINE = 'medibook.sessions'``.
+"""
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.utils import timezone
+
+
+REFRESHED_KEY = '_session_refreshed'
+
+
+class LowWriteSessionMixin:
+    """Skip saves of unchanged sessions until their expiry needs refreshing."""
+
+    def refresh_due(self):
+        refreshed = self.get(REFRESHED_KEY)
+        if refreshed is None:
+            return True
+        return timezone.now().timestamp() - refreshed >= settings.SESSION_REFRESH_SECONDS
+
+    def save(self, must_create=False):
+        if not must_create and not self.modified and not self.refresh_due():
+            return
+        self[REFRESHED_KEY] = int(timezone.now().timestamp())
+        super().save(must_create=must_create)
+
+
+class SessionStore(LowWriteSessionMixin, DBStore):
+    pass
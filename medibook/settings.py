@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'medibook.routers.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     # 'django.middleware.csrf.CsrfViewMiddleware',  # Disabled for simplicity
@@ -62,6 +63,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'medibook.wsgi.application'
 
+# Serve the read-heavy views (dashboards, doctor list, slot lookups) from
+# appointments/async_views.py; medibook/asgi.py turns this on
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -73,6 +78,101 @@ DATABASES = {
     }
 }
 
+# DATABASE_PROFILE=production tunes SQLite for concurrent requests: WAL lets
+# readers run alongside the writer, transactions take the write lock up
+# front (medibook/backends/sqlite3) and wait for it instead of failing with
+# "database is locked", and connections (with their PRAGMAs, applied in
+# medibook/db.py) are reused across requests
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='development')
+
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'medibook.backends.sqlite3',
+        'TRANSACTION_MODE': 'IMMEDIATE',
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,  # seconds to wait for the write lock
+        },
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+        },
+    })
+
+# DATABASE_PROFILE=postgres runs on PostgreSQL, with an optional streaming
+# replica (POSTGRES_REPLICA_HOST) that serves the dashboards, the doctor list
+# and the exports (see medibook/routers.py). Connections persist for
+# CONN_MAX_AGE; for pooling across workers put PgBouncer in front and set
+# PGBOUNCER=True, which turns off server-side cursors since they do not
+# survive transaction pooling.
+if DATABASE_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('POSTGRES_DB', default='medibook'),
+            'USER': config('POSTGRES_USER', default='medibook'),
+            'PASSWORD': config('POSTGRES_PASSWORD', default=''),
+            'HOST': config('POSTGRES_HOST', default='localhost'),
+            'PORT': config('POSTGRES_PORT', default='5432'),
+            'CONN_MAX_AGE': config('CONN_MAX_AGE', default=600, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': config('PGBOUNCER', default=False, cast=bool),
+        }
+    }
+    if config('POSTGRES_REPLICA_HOST', default=''):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': config('POSTGRES_REPLICA_HOST'),
+            'PORT': config('POSTGRES_REPLICA_PORT', default=DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# DATABASE_PROFILE=sqlite-replica stands two unreplicated SQLite files in
+# for a primary and a replica, to exercise the routing locally and in tests
+if DATABASE_PROFILE == 'sqlite-replica':
+    DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_primary.sqlite3'}
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'test_replica.sqlite3'},
+    }
+
+DATABASE_ROUTERS = ['medibook.routers.PrimaryReplicaRouter']
+
+# How long a client that wrote reads from the primary, covering replica lag
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
+
+# Cache
+# The slot bitmaps, the doctor directory and the dashboard fragments
+# (appointments/availability.py, directory.py and fragments.py) are
+# invalidated by bumping versions kept in this cache, so every worker
+# process must share it: set REDIS_URL wherever more than one process
+# serves requests. The in-process fallback only suits development and
+# single-process servers (manage.py check --deploy warns about it).
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {
+                # A 60-day range lookup alone writes 60 day entries
+                'MAX_ENTRIES': 100000,
+            },
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -133,6 +233,21 @@ MESSAGE_TAGS = {
     messages.ERROR: 'danger',
 }
 
+# Booking settings
+SLOT_HOLD_SECONDS = 300  # 5 minutes
+
+# Lifetime of the cached dashboard fragments; a changed appointment
+# invalidates them sooner (see appointments/fragments.py)
+FRAGMENT_CACHE_SECONDS = 600
+
+# Doctor directory pagination
+DOCTOR_LIST_PAGE_SIZE = 20
+DOCTOR_LIST_MAX_PAGE_SIZE = 100
+
 # Session settings
+SESSION_ENGINE = config('SESSION_ENGINE', default='medibook.sessions')
 SESSION_COOKIE_AGE = 86400  # 24 hours
 SESSION_SAVE_EVERY_REQUEST = True
+# medibook.sessions only rewrites an unchanged session once its last write
+# is this old, instead of on every request
+SESSION_REFRESH_SECONDS = 3600  # 1 hour